@@ -1,24 +1,39 @@
 # app/api/endpoints/attendance.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+import asyncio
+import json
 import os
+import re
+import tempfile
+from datetime import datetime
 from app.services.analytics_service import record_query
+from app.services.face_tracking import IoUTracker
 # Import attendance service
 try:
     from app.services.attendance_service import (
         process_attendance_image, 
+        process_attendance_batch,
+        BATCH_ATTENDANCE_SETTINGS,
+        render_annotation,
+        detect_stream_frame,
+        record_attendance_async,
+        STREAM_ATTENDANCE_SETTINGS,
         get_attendance_stats, 
-        export_attendance_data
+        export_attendance_data,
+        attendance_tracker
     )
+    from app.services.attendance_store import attendance_store, iter_export, normalize_bound
     ATTENDANCE_AVAILABLE = True
 except ImportError as e:
     print(f"Attendance service import error: {e}")
     ATTENDANCE_AVAILABLE = False
     
     # Create dummy functions
-    async def process_attendance_image(image_data: bytes) -> Dict:
+    async def process_attendance_image(image_data: bytes, mode: str = "standard", annotate: str = "lazy",
+                                       class_id: Optional[str] = None) -> Dict:
         return {
             'headcount': 0,
             'faces_detected': [],
@@ -28,6 +43,12 @@ except ImportError as e:
             'error': 'Attendance service not available'
         }
     
+    async def process_attendance_batch(**kwargs) -> Dict:
+        return {}
+    
+    async def render_annotation(session_id: str) -> Optional[str]:
+        return None
+    
     async def get_attendance_stats() -> Dict:
         return {
             'total_records': 0,
@@ -37,7 +58,7 @@ except ImportError as e:
             'recent_records': []
         }
     
-    def export_attendance_data() -> str:
+    def export_attendance_data(**kwargs) -> str:
         return None
 
 router = APIRouter()
@@ -50,20 +71,45 @@ class AttendanceResponse(BaseModel):
     annotated_image_url: Optional[str]
     error: Optional[str] = None
 
+class BatchAttendanceResponse(BaseModel):
+    headcount: int
+    median_headcount: int
+    max_headcount: int
+    mean_headcount: float
+    aggregate: str
+    frames_analyzed: int
+    frames: List[Dict]
+    timestamp: str
+    session_id: Optional[str]
+    detection_method: str
+
 class AttendanceStats(BaseModel):
     total_records: int
     average_attendance: float
     max_attendance: int
     min_attendance: int
     recent_records: List[Dict]
+    daily: List[Dict] = []
+    weekly: List[Dict] = []
 
 class ManualAttendanceRequest(BaseModel):
     headcount: int
     notes: Optional[str] = None
 
 @router.post("/attendance/upload", response_model=AttendanceResponse)
-async def upload_attendance_image(file: UploadFile = File(...)):
-    """Upload image for automatic headcount detection"""
+async def upload_attendance_image(
+    request: Request,
+    file: UploadFile = File(...),
+    mode: str = Form("standard"),
+    annotate: str = Form("lazy"),
+    class_id: Optional[str] = Form(None)
+):
+    """Upload image for automatic headcount detection.
+
+    Use mode "tiled" for wide, high-resolution photos of large rooms.
+    The annotated image is drawn when its URL is first fetched ("lazy"),
+    right after the response ("background"), or not at all ("none").
+    """
     try:
         if not ATTENDANCE_AVAILABLE:
             raise HTTPException(status_code=503, detail="Attendance service not available")
@@ -72,6 +118,12 @@ async def upload_attendance_image(file: UploadFile = File(...)):
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
+        if mode not in ("standard", "tiled"):
+            raise HTTPException(status_code=400, detail="mode must be 'standard' or 'tiled'")
+        
+        if annotate not in ("lazy", "background", "none"):
+            raise HTTPException(status_code=400, detail="annotate must be 'lazy', 'background' or 'none'")
+        
         # Read image data
         image_data = await file.read()
         
@@ -79,7 +131,12 @@ async def upload_attendance_image(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Empty file")
         
         # Process attendance
-        result = await process_attendance_image(image_data)
+        result = await process_attendance_image(image_data, mode, annotate, class_id)
+        if result.get('annotation_id'):
+            # Routers are mounted under a prefix; let the app build the path
+            result['annotated_image_url'] = request.url_for(
+                "get_attendance_image", filename=result['annotation_id']
+            ).path
         
         return AttendanceResponse(**result)
         
@@ -88,6 +145,178 @@ async def upload_attendance_image(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def _is_video(file: UploadFile) -> bool:
+    content_type = file.content_type or ""
+    return content_type.startswith("video/") or os.path.splitext(file.filename or "")[1].lower() in VIDEO_EXTENSIONS
+
+@router.post("/attendance/batch", response_model=BatchAttendanceResponse)
+async def upload_attendance_batch(
+    files: List[UploadFile] = File(...),
+    sample_fps: Optional[float] = Form(None),
+    aggregate: Optional[str] = Form(None),
+    class_id: Optional[str] = Form(None)
+):
+    """Headcount from a burst of photos or one short classroom video.
+
+    Video frames are sampled at `sample_fps`; the recorded headcount is the
+    median (default) or max across analysed frames.
+    """
+    try:
+        if not ATTENDANCE_AVAILABLE:
+            raise HTTPException(status_code=503, detail="Attendance service not available")
+        
+        if aggregate is not None and aggregate not in ("median", "max"):
+            raise HTTPException(status_code=400, detail="aggregate must be 'median' or 'max'")
+        
+        # Refuse oversized bursts before reading any of them into memory
+        max_frames = BATCH_ATTENDANCE_SETTINGS['max_frames']
+        if len(files) > max_frames:
+            raise HTTPException(status_code=400, detail=f"At most {max_frames} photos per batch")
+        
+        videos = [file for file in files if _is_video(file)]
+        if videos:
+            if len(files) != 1:
+                raise HTTPException(status_code=400, detail="Upload either one video or a set of photos")
+            
+            # OpenCV reads video from a path; copy the upload without holding it in memory
+            suffix = os.path.splitext(videos[0].filename or "")[1] or ".mp4"
+            fd, video_path = tempfile.mkstemp(suffix=suffix)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    while chunk := await videos[0].read(UPLOAD_CHUNK_BYTES):
+                        f.write(chunk)
+                result = await process_attendance_batch(video_path=video_path, sample_fps=sample_fps, aggregate=aggregate,
+                                                        class_id=class_id)
+            finally:
+                os.remove(video_path)
+        else:
+            if any(not (file.content_type or "").startswith("image/") for file in files):
+                raise HTTPException(status_code=400, detail="Files must be images or a video")
+            photos = [await file.read() for file in files]
+            result = await process_attendance_batch(photos=photos, aggregate=aggregate, class_id=class_id)
+        
+        return BatchAttendanceResponse(**result)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+def _detect_interval(value) -> Optional[int]:
+    """A positive detection interval, or None if the value isn't one"""
+    try:
+        interval = int(value)
+    except (TypeError, ValueError):
+        return None
+    return interval if interval >= 1 else None
+
+@router.websocket("/ws/attendance")
+async def attendance_stream(ws: WebSocket):
+    """Live headcount from webcam frames sent as binary JPEG messages.
+
+    The detector runs on every Nth frame (query param `detect_every`), and
+    only when the previous pass has finished; other frames are not even
+    decoded, tracks just advance. A {"type": "headcount"} message is pushed
+    whenever the confirmed count changes. Text commands:
+    {"type": "record", "class_id": ...} stores the current count as an attendance record,
+    {"type": "config", "detect_every": N} changes the detection interval.
+    """
+    await ws.accept()
+    if not ATTENDANCE_AVAILABLE:
+        await ws.close(code=1011)
+        return
+    
+    settings = STREAM_ATTENDANCE_SETTINGS
+    detect_every = settings['detect_every']
+    requested_interval = ws.query_params.get("detect_every")
+    if requested_interval is not None:
+        if _detect_interval(requested_interval) is None:
+            await ws.send_text(json.dumps({
+                "type": "error",
+                "message": f"detect_every must be a positive integer; using {detect_every}"
+            }))
+        else:
+            detect_every = _detect_interval(requested_interval)
+    tracker = IoUTracker(settings['iou_threshold'], settings['min_hits'], settings['max_missed'])
+    stats = {"frames": 0, "detected": 0, "skipped_busy": 0}
+    last_headcount = None
+    last_detect_frame = -detect_every
+    detection = None
+    
+    async def send(payload: dict):
+        await ws.send_text(json.dumps(payload))
+    
+    async def detect(frame_data: bytes, frame_index: int):
+        nonlocal last_headcount
+        boxes = await detect_stream_frame(frame_data)
+        if boxes is None:
+            return
+        stats["detected"] += 1
+        tracker.update(boxes)
+        if tracker.headcount != last_headcount:
+            last_headcount = tracker.headcount
+            await send({
+                "type": "headcount",
+                "headcount": last_headcount,
+                "frame": frame_index,
+                "faces": tracker.faces()
+            })
+    
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = None
+                if not isinstance(command, dict):
+                    await send({"type": "error", "message": "Commands must be JSON objects"})
+                    continue
+                if command.get("type") == "record":
+                    record = await record_attendance_async(tracker.headcount, class_id=command.get("class_id"))
+                    await send({"type": "recorded", **record})
+                elif command.get("type") == "config":
+                    interval = _detect_interval(command.get("detect_every"))
+                    if interval is None:
+                        await send({"type": "error", "message": "detect_every must be a positive integer"})
+                    else:
+                        detect_every = interval
+                elif command.get("type") == "stats":
+                    await send({"type": "stats", **stats, "detect_every": detect_every, "headcount": tracker.headcount})
+                continue
+            
+            frame_data = message.get("bytes")
+            if not frame_data:
+                continue
+            frame_index = stats["frames"]
+            stats["frames"] += 1
+            tracker.predict()
+            
+            if frame_index - last_detect_frame >= detect_every:
+                # Never queue detections behind a slow one; drop to the next due frame
+                if detection is not None and not detection.done():
+                    stats["skipped_busy"] += 1
+                    continue
+                last_detect_frame = frame_index
+                detection = asyncio.create_task(detect(frame_data, frame_index))
+    
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Attendance stream error: {e}")
+    finally:
+        if detection is not None:
+            detection.cancel()
+
 @router.get("/attendance/stats", response_model=AttendanceStats)
 async def get_attendance_statistics():
     """Get attendance statistics and summary"""
@@ -101,24 +330,115 @@ async def get_attendance_statistics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stats error: {str(e)}")
 
+def _range_bounds(start: Optional[str], end: Optional[str]):
+    try:
+        return normalize_bound(start), normalize_bound(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO dates or datetimes")
+
+@router.get("/attendance/records")
+async def get_attendance_records(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    class_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    limit: int = 1000
+):
+    """Attendance records in [start, end), oldest first"""
+    if not ATTENDANCE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Attendance service not available")
+    start, end = _range_bounds(start, end)
+    loop = asyncio.get_event_loop()
+    records = await loop.run_in_executor(
+        None, lambda: attendance_store.records(start, end, class_id, session_id, max(1, min(limit, 10000)))
+    )
+    return {"records": records, "count": len(records)}
+
+@router.get("/attendance/aggregates")
+async def get_attendance_aggregates(
+    period: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    class_id: Optional[str] = None
+):
+    """Average, min and max headcount per day or week"""
+    if not ATTENDANCE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Attendance service not available")
+    if period not in ("day", "week"):
+        raise HTTPException(status_code=400, detail="period must be 'day' or 'week'")
+    start, end = _range_bounds(start, end)
+    loop = asyncio.get_event_loop()
+    aggregates = await loop.run_in_executor(
+        None, lambda: attendance_store.aggregates(period, start, end, class_id)
+    )
+    return {"period": period, "aggregates": aggregates}
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+@router.get("/attendance/export")
+async def export_attendance(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    class_id: Optional[str] = None,
+    save: bool = False
+):
+    """Stream attendance records as CSV or NDJSON.
+
+    Rows are read from the store in batches as the response is sent, so
+    exports of any size use constant memory. With save=true the export is
+    written to static/exports instead and its URL returned.
+    """
+    if not ATTENDANCE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Attendance service not available")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    start, end = _range_bounds(start, end)
+    
+    if save:
+        loop = asyncio.get_event_loop()
+        url = await loop.run_in_executor(
+            None, lambda: export_attendance_data(export_format=format, start=start, end=end, class_id=class_id)
+        )
+        if url is None:
+            raise HTTPException(status_code=500, detail="Export failed")
+        return {"url": url}
+    
+    filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        iter_export(attendance_store.iter_records(start, end, class_id), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/attendance/status")
 async def get_attendance_status():
     """Get attendance service status"""
     return {
         "available": ATTENDANCE_AVAILABLE,
+        "detector": attendance_tracker.detector_handle.status() if ATTENDANCE_AVAILABLE else None,
         "message": "Attendance service ready" if ATTENDANCE_AVAILABLE else "OpenCV required for attendance tracking"
     }
 
+SESSION_ID = re.compile(r"^[0-9A-Za-z_]+$")
+
 @router.get("/attendance/image/{filename}")
 async def get_attendance_image(filename: str):
-    """Get annotated attendance image"""
-    image_path = os.path.join("static", "attendance", filename)
+    """Get annotated attendance image, rendering it on first request.
+
+    Accepts a session id or the attendance_<session id>.jpg file name.
+    """
+    session_id = os.path.basename(filename)
+    if session_id.startswith("attendance_") and session_id.endswith(".jpg"):
+        session_id = session_id[len("attendance_"):-len(".jpg")]
+    
+    image_path = await render_annotation(session_id) if SESSION_ID.match(session_id) else None
     
-    if not os.path.exists(image_path):
+    if not image_path or not os.path.exists(image_path):
         raise HTTPException(status_code=404, detail="Image not found")
     
     return FileResponse(
         image_path,
         media_type="image/jpeg",
-        filename=filename
+        filename=os.path.basename(image_path)
     )
\ No newline at end of file
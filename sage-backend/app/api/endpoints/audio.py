@@ -1,113 +1,343 @@
 # app/api/endpoints/audio.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.audio_service import transcribe_chunk
-from app.core.model import generate_from_model
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.services.audio_service import (
+    StreamingTranscriber,
+    STREAM_SETTINGS,
+    LectureUpload,
+    transcribe_lecture_stream,
+    lecture_executor,
+    get_transcription_status
+)
+from app.services.gen_service import generate_from_prompt, stream_from_prompt
+from app.services.tts_service import generate_speech
+from app.services.audio_formats import negotiate_audio_format, media_type
+from app.services.utils import SentenceBuffer
+from app.services.session_service import response_mailboxes, new_session_id
 from app.services.analytics_service import record_query
+from app.services.pdf_service import chunk_text
+from app.core.rag import build_index_from_chunks, find_known_file
 import asyncio
 import json
+import os
+from contextlib import aclosing
 
 router = APIRouter()
-last_response = {"transcript": "", "response": "", "ready": False}
+
+async def _stream_transcripts(ws: WebSocket, transcriber: StreamingTranscriber, new_audio: asyncio.Event):
+    """Decode audio as it arrives and push partial/final transcript messages"""
+    try:
+        while True:
+            await new_audio.wait()
+            new_audio.clear()
+            messages = await transcriber.step()
+            for message in messages:
+                await ws.send_text(json.dumps(message))
+            # Throttle re-decoding of the growing recording
+            await asyncio.sleep(STREAM_SETTINGS['partial_interval_s'])
+    except Exception as e:
+        # Socket closed mid-send; the final transcript is still produced by finish()
+        print(f"Streaming transcription stopped: {e}")
+
+async def _finish_stream(transcriber: StreamingTranscriber, streamer: asyncio.Task) -> str:
+    """Stop partial decoding and transcribe only the still-open final segment"""
+    streamer.cancel()
+    return await transcriber.finish()
+
+def _read_audio_file(audio_url: str) -> bytes:
+    with open(audio_url.lstrip("/"), "rb") as f:
+        return f.read()
+
+class _SocketSender:
+    """Sends to a websocket, remembering (instead of raising) once the client is gone"""
+
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.open = True
+        # Spoken answers are sent in the format the client asked for when connecting
+        self.audio_format = negotiate_audio_format(ws.query_params.get("audio_format"))
+
+    async def text(self, payload: dict):
+        if self.open:
+            try:
+                await self.ws.send_text(json.dumps(payload))
+            except Exception:
+                self.open = False
+
+    async def bytes(self, data: bytes):
+        if self.open:
+            try:
+                await self.ws.send_bytes(data)
+            except Exception:
+                self.open = False
+
+async def _speak_sentences(sender: _SocketSender, sentences: asyncio.Queue) -> int:
+    """Synthesize queued sentences in order and push each one's audio down the socket"""
+    loop = asyncio.get_event_loop()
+    index = 0
+    while True:
+        sentence = await sentences.get()
+        if sentence is None:
+            return index
+        # Nobody left to hear it
+        if not sender.open:
+            continue
+        audio_url = await generate_speech(sentence, sender.audio_format)
+        if audio_url is None:
+            continue
+        audio_bytes = await loop.run_in_executor(None, _read_audio_file, audio_url)
+        # Header message, then the audio bytes as a binary frame
+        await sender.text({
+            "type": "tts_segment",
+            "index": index,
+            "text": sentence,
+            "audio_url": audio_url,
+            "media_type": media_type(os.path.splitext(audio_url)[1].lstrip("."))
+        })
+        await sender.bytes(audio_bytes)
+        index += 1
+
+async def stream_spoken_answer(sender: _SocketSender, transcript: str) -> str:
+    """Stream LLM tokens to the client and speak each sentence as soon as it completes.
+
+    TTS for sentence N runs while the model is still generating sentence N+1,
+    so the first audio arrives long before the full answer is ready. If the
+    client disconnects, generation stops and the answer so far is returned
+    for the session mailbox.
+    """
+    sentences = asyncio.Queue()
+    speaker = asyncio.create_task(_speak_sentences(sender, sentences))
+    buffer = SentenceBuffer()
+    pieces = []
+    
+    try:
+        async with aclosing(stream_from_prompt(transcript)) as stream:
+            async for piece in stream:
+                pieces.append(piece)
+                await sender.text({"type": "llm_token", "text": piece})
+                # Nobody left to read it; stop the model rather than finish the answer
+                if not sender.open:
+                    break
+                for sentence in buffer.add(piece):
+                    sentences.put_nowait(sentence)
+        for sentence in buffer.flush():
+            sentences.put_nowait(sentence)
+    finally:
+        sentences.put_nowait(None)
+    
+    answer = "".join(pieces).strip()
+    await sender.text({
+        "type": "llm_response",
+        "text": answer,
+        "final_transcript": transcript
+    })
+    segments = await speaker
+    await sender.text({"type": "tts_done", "segments": segments})
+    return answer
+
 @router.websocket("/ws/transcribe")
 async def websocket_transcribe(ws: WebSocket):
     await ws.accept()
-    audio_chunks = []
+    # Every connection gets its own mailbox unless the client resumes a session
+    session_id = ws.query_params.get("session_id") or new_session_id()
+    await ws.send_text(json.dumps({"type": "session", "session_id": session_id}))
+    
+    transcriber = StreamingTranscriber()
+    new_audio = asyncio.Event()
+    streamer = asyncio.create_task(_stream_transcripts(ws, transcriber, new_audio))
+    chunk_count = 0
     
     try:
         while True:
-            # Receive audio chunk (no timeout)
-            chunk = await ws.receive_bytes()
+            # Receive audio chunk (no timeout) or a control message
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            if message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = None
+                if not isinstance(command, dict):
+                    await ws.send_text(json.dumps({"type": "error", "message": "Control messages must be JSON objects"}))
+                    continue
+                # {"type": "end"} closes the utterance while keeping the socket open
+                if command.get("type") == "end":
+                    break
+                continue
             
+            chunk = message.get("bytes") or b""
             # Store chunk for processing
             if len(chunk) > 100:
-                audio_chunks.append(chunk)
+                transcriber.add(chunk)
+                chunk_count += 1
+                new_audio.set()
                 
                 # Send acknowledgment to client
                 await ws.send_text(json.dumps({
                     "type": "chunk_received", 
-                    "chunk_count": len(audio_chunks)
+                    "chunk_count": chunk_count
                 }))
+        
+        # Utterance ended with the socket open: push the answer on the socket
+        await process_audio_and_respond(ws, session_id, transcriber, streamer)
 
     except WebSocketDisconnect:
         print("Client disconnected, processing audio...")
-        # Process audio after disconnect
-        if audio_chunks:
+        # Process audio after disconnect; earlier segments are already transcribed
+        if chunk_count:
             try:
-                combined_audio = b''.join(audio_chunks)
-                final_transcript = await transcribe_chunk(combined_audio)
+                final_transcript = await _finish_stream(transcriber, streamer)
                 
                 if final_transcript.strip():
                     record_query("voice")
                     print(f"Final transcript: {final_transcript}")
-                    llm_answer = generate_from_model(final_transcript)
+                    llm_answer = await generate_from_prompt(final_transcript)
                     print(f"LLM response: {llm_answer[:100]}...")
                     
-                    # Store for client polling (from your other version)
-                    last_response["transcript"] = final_transcript
-                    last_response["response"] = llm_answer
-                    last_response["ready"] = True
+                    # Hold for the session's (long-)polling client
+                    _deliver_to_mailbox(session_id, final_transcript, llm_answer)
                     
                 else:
                     print("No speech detected")
                     
             except Exception as e:
                 print(f"Processing error: {e}")
+        else:
+            streamer.cancel()
+            transcriber.close()
     
     except Exception as e:
+        streamer.cancel()
+        transcriber.close()
         print(f"WebSocket error: {e}")
 
+def _deliver_to_mailbox(session_id: str, transcript: str, answer: str):
+    response_mailboxes.put(session_id, {
+        "transcript": transcript,
+        "response": answer,
+        "ready": True
+    })
+
+@router.post("/transcribe/lecture")
+async def transcribe_lecture(request: Request, filename: str = "lecture", index: bool = False):
+    """Transcribe a long recording sent as the raw request body.
+
+    The body is streamed to a temp file and decoded while it uploads, so
+    memory stays bounded regardless of length. WebM, Ogg, MP3, WAV, FLAC and
+    fast-start MP4 decode progressively; m4a/mp4/mov with the moov box at
+    the end are decoded once the upload completes. Timestamped segments are
+    returned as NDJSON lines; with `index` the transcript is also added to
+    the knowledge base.
+    """
+    loop = asyncio.get_event_loop()
+    segments = asyncio.Queue()
+    upload = LectureUpload(suffix=os.path.splitext(filename)[1])
+
+    def emit(segment: dict):
+        loop.call_soon_threadsafe(segments.put_nowait, segment)
+
+    worker = loop.run_in_executor(lecture_executor, transcribe_lecture_stream, upload.reader, emit)
+    # Signal the end of the segment stream whether decoding succeeded or not
+    worker.add_done_callback(lambda _: segments.put_nowait(None))
+
+    try:
+        async for chunk in request.stream():
+            await loop.run_in_executor(None, upload.write, chunk)
+    except Exception:
+        upload.cleanup()
+        raise
+    upload.finish()
+
+    async def results():
+        texts = []
+        try:
+            while True:
+                segment = await segments.get()
+                if segment is None:
+                    break
+                texts.append(segment["text"])
+                yield json.dumps({"type": "segment", **segment}) + "\n"
+
+            try:
+                worker.result()
+            except Exception as e:
+                yield json.dumps({"type": "error", "message": f"Could not decode audio: {e}"}) + "\n"
+                return
+
+            summary = {"type": "done", "segments": len(texts), "bytes": upload.size}
+            transcript = "\n\n".join(text for text in texts if text)
+            if index and transcript:
+                file_hash = upload.sha256.hexdigest()
+                duplicate_of = find_known_file(file_hash)
+                if duplicate_of:
+                    summary["index"] = {"duplicate_of": duplicate_of}
+                else:
+                    chunks = chunk_text(transcript)
+                    summary["index"] = await loop.run_in_executor(
+                        None, build_index_from_chunks, chunks, filename, file_hash
+                    )
+            yield json.dumps(summary) + "\n"
+        finally:
+            upload.cleanup()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/audio/status")
+async def get_audio_status():
+    """Whisper load state, transcription queue depth and real-time factor"""
+    return {**get_transcription_status(), "mailboxes": response_mailboxes.stats()}
+
 @router.get("/get-last-response")
-async def get_last_response():
-    """Get the last transcription response"""
-    if last_response["ready"]:
-        result = last_response.copy()
-        last_response["ready"] = False
+async def get_last_response(session_id: str, wait: float = 0):
+    """Get the next transcription response for a session.
+
+    `session_id` is the id sent in the websocket's {"type": "session"} message.
+
+    With `wait` > 0 this long-polls for up to that many seconds (max 30)
+    instead of returning immediately.
+    """
+    result = await response_mailboxes.wait(session_id, min(max(wait, 0), 30))
+    if result is not None:
         return result
     else:
         return {"ready": False}
     
 
-async def process_audio_and_respond(ws: WebSocket, audio_chunks: list):
+async def process_audio_and_respond(ws: WebSocket, session_id: str, transcriber: StreamingTranscriber, streamer: asyncio.Task):
     """Process audio and send response while WebSocket is open"""
+    sender = _SocketSender(ws)
     try:
         # Send processing status
-        await ws.send_text(json.dumps({"type": "processing", "message": "Processing audio..."}))
+        await sender.text({"type": "processing", "message": "Processing audio..."})
         
-        # Combine and transcribe audio
-        combined_audio = b''.join(audio_chunks)
-        final_transcript = await transcribe_chunk(combined_audio)
+        # Only the still-open final segment remains to be transcribed
+        final_transcript = await _finish_stream(transcriber, streamer)
         
         if final_transcript.strip():
+            record_query("voice")
             print(f"Final transcript: {final_transcript}")
             
             # Send transcript
-            await ws.send_text(json.dumps({
+            await sender.text({
                 "type": "final_transcript", 
                 "text": final_transcript
-            }))
+            })
             
             # Send generating status
-            await ws.send_text(json.dumps({"type": "generating", "message": "Generating response..."}))
-            
-            # Generate LLM response
-            llm_answer = generate_from_model(final_transcript)
-            print(f"Generated response, sending to client...")
-            
-            # Send LLM response (this triggers TTS on client)
-            await ws.send_text(json.dumps({
-                "type": "llm_response", 
-                "text": llm_answer,
-                "final_transcript": final_transcript
-            }))
+            await sender.text({"type": "generating", "message": "Generating response..."})
             
-            print("Response sent to client - TTS should trigger")
+            # Stream the LLM response and its speech to the client
+            llm_answer = await stream_spoken_answer(sender, final_transcript)
             
-            # Keep connection open briefly for TTS to process
-            await asyncio.sleep(3)
+            # The client left mid-answer: keep it for the session's next poll
+            if not sender.open:
+                _deliver_to_mailbox(session_id, final_transcript, llm_answer)
             
         else:
-            await ws.send_text(json.dumps({"type": "error", "message": "No speech detected"}))
+            await sender.text({"type": "error", "message": "No speech detected"})
             
     except Exception as e:
         print(f"Processing error: {e}")
-        await ws.send_text(json.dumps({"type": "error", "message": f"Processing error: {str(e)}"}))
\ No newline at end of file
+        await sender.text({"type": "error", "message": f"Processing error: {str(e)}"})
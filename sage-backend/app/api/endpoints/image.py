@@ -1,70 +1,164 @@
 # app/api/endpoints/image.py
-from fastapi import APIRouter, UploadFile, HTTPException, Form
-import pytesseract
-from PIL import Image
-from app.core.rag import build_index_from_chunks, texts, index
-from app.services.gen_service import generate_llm_response
+from fastapi import APIRouter, UploadFile, HTTPException, Form, File
+from typing import List, Optional
+from app.core.rag import build_index_from_chunks, ingest_documents, find_known_file
+from app.services.gen_service import generate_llm_response, generate_from_prompt
 from app.services.utils import maybe_generate_visual
-from app.services.vision_service import analyze_image_with_vision
+from app.services.vision_service import analyze_image_with_vision, analyze_images_with_vision
+from app.services.ocr_service import extract_text_async, chunks_from_ocr_text, ocr_cache
+from app.services.image_preprocessing import PreparedImage, prepare_image
 from app.services.analytics_service import record_query
-import io
+import asyncio
 
 router = APIRouter()
 
 # Store for image texts to avoid overwriting PDF data
 image_texts = []
 
+def _image_document_name(file: UploadFile, prepared: PreparedImage) -> str:
+    return file.filename or f"image_{prepared.content_hash[:12]}"
+
+async def _ocr_upload(file: UploadFile) -> tuple[PreparedImage, str, list[str], str | None]:
+    """OCR one uploaded image: returns (image, extracted text, chunks, duplicate_of)"""
+    prepared = prepare_image(await file.read())
+    
+    # Identical images were already OCR'd and indexed
+    known_name = find_known_file(prepared.content_hash)
+    if known_name is not None:
+        return prepared, "", [], known_name
+    
+    extracted_text = await extract_text_async(prepared)
+    return prepared, extracted_text.strip(), chunks_from_ocr_text(extracted_text), None
+
 @router.post("/upload-image")
 async def upload_image(file: UploadFile):
     """Extract text from image and add to knowledge base (OCR ONLY - unchanged)"""
     try:
-        # Read and process the uploaded image
-        image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        prepared, extracted_text, new_chunks, duplicate_of = await _ocr_upload(file)
         
-        # Extract text using OCR
-        extracted_text = pytesseract.image_to_string(image, config='--psm 6')
+        if duplicate_of:
+            return {
+                "message": f"This image was already indexed as {duplicate_of}.",
+                "extracted_text": "",
+                "chunks_added": 0
+            }
         
-        if not extracted_text.strip():
+        if not extracted_text:
             return {
                 "message": "No text could be extracted from this image.",
                 "extracted_text": "",
                 "chunks_added": 0
             }
         
-        # Split into chunks and add to existing knowledge base
-        global image_texts
-        new_chunks = [chunk.strip() for chunk in extracted_text.split('\n') if chunk.strip() and len(chunk.strip()) > 20]
-        
+        # Append through the same deduplicating ingestion path as PDFs
+        dedup = None
         if new_chunks:
-            # Add to existing texts instead of replacing
-            all_texts = texts + new_chunks
-            build_index_from_chunks(all_texts)
+            # Embedding and saving the index block, so keep them off the event loop
+            loop = asyncio.get_event_loop()
+            dedup = await loop.run_in_executor(
+                None, build_index_from_chunks, new_chunks, _image_document_name(file, prepared), prepared.content_hash
+            )
             image_texts.extend(new_chunks)
         
+        chunks_added = dedup["chunks_added"] if dedup else 0
         return {
-            "message": f"Successfully extracted and indexed text from image. Added {len(new_chunks)} chunks to knowledge base.",
-            "extracted_text": extracted_text.strip(),
-            "chunks_added": len(new_chunks)
+            "message": f"Successfully extracted and indexed text from image. Added {chunks_added} chunks to knowledge base.",
+            "extracted_text": extracted_text,
+            "chunks_added": chunks_added,
+            "dedup": dedup
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+@router.post("/upload-images")
+async def upload_images(files: List[UploadFile] = File(...)):
+    """OCR several images concurrently and index them with one embedding pass"""
+    try:
+        results = await asyncio.gather(*[_ocr_upload(file) for file in files])
+        
+        documents = []
+        per_file = []
+        for file, (prepared, extracted_text, new_chunks, duplicate_of) in zip(files, results):
+            name = _image_document_name(file, prepared)
+            if new_chunks:
+                documents.append((name, new_chunks, prepared.content_hash))
+                image_texts.extend(new_chunks)
+            per_file.append({
+                "filename": name,
+                "extracted_text": extracted_text,
+                "duplicate_of": duplicate_of
+            })
+        
+        ingested = {"documents": {}, "chunks_added": 0}
+        if documents:
+            loop = asyncio.get_event_loop()
+            ingested = await loop.run_in_executor(None, ingest_documents, documents)
+        for entry in per_file:
+            entry["dedup"] = ingested["documents"].get(entry["filename"])
+        
+        return {
+            "message": f"Processed {len(files)} images. Added {ingested['chunks_added']} chunks to knowledge base.",
+            "chunks_added": ingested["chunks_added"],
+            "ocr_cache": ocr_cache.stats(),
+            "files": per_file
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+
+@router.post("/describe-images")
+async def describe_images(
+    files: List[UploadFile] = File(...),
+    query: str = Form("Describe this image"),
+    mode: Optional[str] = Form(None),
+    index_captions: bool = Form(False)
+):
+    """Run Vision AI on a set of images (e.g. diagram slides) as one batch"""
+    try:
+        prepared = [prepare_image(await file.read()) for file in files]
+        analyses = await analyze_images_with_vision(prepared, query, mode)
+        names = [_image_document_name(file, image) for file, image in zip(files, prepared)]
+        
+        # Optionally make the descriptions searchable alongside OCR text
+        ingested = None
+        if index_captions:
+            documents = [
+                (f"{name} (description)", [f"Image {name}: {analysis}"], None)
+                for name, analysis in zip(names, analyses)
+            ]
+            loop = asyncio.get_event_loop()
+            ingested = await loop.run_in_executor(None, ingest_documents, documents)
+        
+        return {
+            "images": [
+                {"filename": name, "vision_analysis": analysis}
+                for name, analysis in zip(names, analyses)
+            ],
+            "chunks_added": ingested["chunks_added"] if ingested else 0
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+
 @router.post("/query/image")
-async def query_image_direct(file: UploadFile, query: str = Form("What information can you extract from this image?")):
+async def query_image_direct(
+    file: UploadFile,
+    query: str = Form("What information can you extract from this image?"),
+    mode: Optional[str] = Form(None)
+):
     record_query("image")
     """Query image using BOTH OCR and Vision AI (VISION PRIORITIZED)"""
     try:
-        # Read and process the uploaded image
+        # Read the uploaded image and decode it once for both stages
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # 1. Analyze image using Vision AI FIRST
-        vision_analysis = await analyze_image_with_vision(image_bytes, query)
+        prepared = prepare_image(image_bytes)
         
-        # 2. Extract text using OCR
-        extracted_text = pytesseract.image_to_string(image, config='--psm 6')
+        # 1+2. Run Vision AI and OCR concurrently, both off the event loop
+        vision_analysis, extracted_text = await asyncio.gather(
+            analyze_image_with_vision(prepared, query, mode),
+            extract_text_async(prepared)
+        )
         
         # 3. Create smart prompt that prioritizes vision
         if extracted_text.strip() and len(extracted_text.strip()) > 10:
@@ -99,9 +193,8 @@ INSTRUCTIONS:
 
 RESPONSE:"""
         
-        # Generate response using the model
-        from app.core.model import generate_from_model
-        answer = generate_from_model(prompt)
+        # Generate response using the shared async generation path
+        answer = await generate_from_prompt(prompt)
         visual = maybe_generate_visual(answer)
 
         return {
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from typing import List
-from app.core.rag import get_indexed_pdf_names, clear_knowledge_base_on_startup
+from app.core.rag import get_indexed_pdf_names, clear_knowledge_base_on_startup, load_knowledge_base
 
 router = APIRouter()
 
@@ -12,4 +12,10 @@ async def get_pdfs():
 async def clear_knowledge_base():
     """Clear the entire knowledge base"""
     clear_knowledge_base_on_startup()
-    return {"message": "Knowledge base cleared successfully"}
\ No newline at end of file
+    return {"message": "Knowledge base cleared successfully"}
+
+@router.post("/knowledge/reload")
+async def reload_knowledge_base():
+    """Reload the knowledge base from disk (e.g. after running ingest.py)"""
+    load_knowledge_base()
+    return {"message": "Knowledge base reloaded", "documents": len(get_indexed_pdf_names())}
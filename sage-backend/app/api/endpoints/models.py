@@ -0,0 +1,10 @@
+# app/api/endpoints/models.py
+from fastapi import APIRouter
+from app.core.model_manager import get_models_status
+
+router = APIRouter()
+
+@router.get("/models/status")
+async def get_models_status_endpoint():
+    """Load state, usage and resident memory of on-demand models"""
+    return get_models_status()
@@ -1,15 +1,20 @@
 # app/api/endpoints/tts.py
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import os
+import re
+from app.services.artifact_service import artifact_janitor
+from app.services.audio_formats import negotiate_audio_format, media_type
 
 # Import TTS service
 try:
     from app.services.tts_service import (
         generate_speech, 
-        cleanup_old_audio_files, 
+        stream_speech,
+        speech_file_in_format,
         get_tts_status,
         update_tts_settings,
         get_available_voices
@@ -17,10 +22,13 @@ try:
 except ImportError as e:
     print(f"TTS service import error: {e}")
     # Create dummy functions
-    async def generate_speech(text: str) -> Optional[str]:
+    async def generate_speech(text: str, audio_format: str = "wav") -> Optional[str]:
         return None
-    def cleanup_old_audio_files():
-        pass
+    async def speech_file_in_format(filename: str, audio_format: str) -> Optional[str]:
+        return None
+    async def stream_speech(text: str):
+        return
+        yield
     def get_tts_status():
         return {"status": "TTS Service Not Available"}
     def update_tts_settings(**kwargs):
@@ -32,12 +40,13 @@ router = APIRouter()
 
 class TTSRequest(BaseModel):
     text: str
-    cleanup: bool = True
+    format: Optional[str] = None        # "wav", "ogg"/"opus" or "mp3"
 
 class TTSResponse(BaseModel):
     audio_url: str
     text: str
     message: str
+    format: str = "wav"
 
 @router.post("/tts/generate", response_model=TTSResponse)
 async def generate_text_to_speech(request: TTSRequest):
@@ -49,12 +58,9 @@ async def generate_text_to_speech(request: TTSRequest):
         if len(request.text) > 1000:
             raise HTTPException(status_code=400, detail="Text too long (max 1000 characters)")
         
-        # Clean up old files if requested
-        if request.cleanup:
-            cleanup_old_audio_files()
-        
         # Generate speech
-        audio_url = await generate_speech(request.text)
+        audio_format = negotiate_audio_format(request.format)
+        audio_url = await generate_speech(request.text, audio_format)
         
         if audio_url is None:
             raise HTTPException(status_code=500, detail="Failed to generate speech - TTS may not be available")
@@ -62,7 +68,8 @@ async def generate_text_to_speech(request: TTSRequest):
         return TTSResponse(
             audio_url=audio_url,
             text=request.text,
-            message="Speech generated successfully"
+            message="Speech generated successfully",
+            format=os.path.splitext(audio_url)[1].lstrip(".")
         )
         
     except HTTPException:
@@ -70,6 +77,32 @@ async def generate_text_to_speech(request: TTSRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"TTS error: {str(e)}")
 
+class TTSStreamRequest(BaseModel):
+    text: str
+
+def _speech_stream_response(text: str) -> StreamingResponse:
+    if not text or not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    return StreamingResponse(
+        stream_speech(text),
+        media_type="audio/wav",
+        headers={"Cache-Control": "no-store"}
+    )
+
+@router.post("/tts/stream")
+async def stream_text_to_speech(request: TTSStreamRequest):
+    """Stream speech for text of any length as a single chunked WAV response.
+
+    Sentences are synthesized in order and sent as soon as each is ready,
+    so playback starts after the first sentence.
+    """
+    return _speech_stream_response(request.text)
+
+@router.get("/tts/stream")
+async def stream_text_to_speech_get(text: str):
+    """Same as POST /tts/stream, usable directly as an <audio> source"""
+    return _speech_stream_response(text)
+
 class TTSSettingsRequest(BaseModel):
     rate: Optional[int] = None          # 50-400 (words per minute)
     volume: Optional[float] = None      # 0.0-1.0
@@ -106,25 +139,84 @@ async def get_voices():
     """Get list of available voices"""
     return {"voices": get_available_voices()}
 
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+RANGE_CHUNK_BYTES = 64 * 1024
+
+def _file_range_response(path: str, media: str, range_header: Optional[str]) -> Response:
+    """Serve a file, honouring a single-range Range header so players can start early and seek"""
+    size = os.path.getsize(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept",
+        "Content-Disposition": f'attachment; filename="{os.path.basename(path)}"'
+    }
+    match = RANGE_HEADER.match(range_header.strip()) if range_header else None
+    if match is None or not any(match.groups()):
+        return FileResponse(path, media_type=media, headers=headers)
+    
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the final N bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    if start >= size or start > end:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    def read_range():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(RANGE_CHUNK_BYTES, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+    
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1)
+    })
+    return StreamingResponse(read_range(), status_code=206, media_type=media, headers=headers)
+
 @router.get("/tts/audio/{filename}")
-async def get_audio_file(filename: str):
-    """Serve generated audio files"""
+async def get_audio_file(filename: str, request: Request, format: Optional[str] = None):
+    """Serve generated audio files.
+
+    The format comes from `format` or the Accept header (defaulting to the
+    file's own); cached speech is re-encoded to Opus or MP3 on demand.
+    Range requests are supported.
+    """
+    filename = os.path.basename(filename)
     audio_path = os.path.join("static", "audio", filename)
+    current_format = os.path.splitext(filename)[1].lstrip(".").lower()
+    
+    audio_format = negotiate_audio_format(format, request.headers.get("accept"), fallback=current_format)
+    if audio_format != current_format:
+        converted = await speech_file_in_format(filename, audio_format)
+        if converted is not None:
+            audio_path = converted
+        else:
+            audio_format = current_format
     
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail="Audio file not found")
     
-    return FileResponse(
-        audio_path,
-        media_type="audio/wav",
-        filename=filename
-    )
+    try:
+        media = media_type(audio_format)
+    except KeyError:
+        media = "application/octet-stream"
+    return _file_range_response(audio_path, media, request.headers.get("range"))
 
 @router.delete("/tts/cleanup")
 async def cleanup_audio_files():
-    """Manually trigger cleanup of old audio files"""
+    """Run the artifact janitor now instead of waiting for its next pass"""
     try:
-        cleanup_old_audio_files()
-        return {"message": "Audio files cleaned up successfully"}
+        loop = asyncio.get_event_loop()
+        evicted = await loop.run_in_executor(None, artifact_janitor.run_once)
+        return {"message": "Audio files cleaned up successfully", "evicted": evicted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cleanup error: {str(e)}")
\ No newline at end of file
@@ -11,6 +11,10 @@ async def upload_pdf(file: UploadFile = File(...)):
         f.write(await file.read())
 
     # Process it for RAG
-    process_pdf_and_build_index(file_location)
+    dedup = process_pdf_and_build_index(file_location)
 
-    return {"status": "PDF uploaded and indexed", "filename": file.filename}
+    if dedup["duplicate_of"]:
+        status = f"PDF already indexed as {dedup['duplicate_of']}"
+    else:
+        status = "PDF uploaded and indexed"
+    return {"status": status, "filename": file.filename, "dedup": dedup}
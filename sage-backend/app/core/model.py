@@ -1,7 +1,9 @@
 from optimum.intel.openvino import OVModelForCausalLM
-from transformers import AutoTokenizer
+from transformers import AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 import os
 import re
+import threading
+import torch
 
 MODEL_PATH = os.path.join("models", "qwen2.5-optimized-int8")
 
@@ -17,14 +19,66 @@ tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH, trust_remote_code=True)
 if tokenizer.pad_token is None:
     tokenizer.pad_token = tokenizer.eos_token
 
+# Add system prompt to establish models identity
+SYSTEM_PROMPT = "You are SAGE, a classroom assistant. You help students and teachers ONLY with their classroom activities and lectures. Provide helpful, educational responses ONLY. If the question is not related to education, apologize and say you cannot answer that as you are a classroom assistant."
+
+# Generation parameters shared by the blocking and streaming paths
+GENERATION_KWARGS = {
+    "max_new_tokens": 1024,
+    "do_sample": True,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "repetition_penalty": 1.02,
+    "pad_token_id": tokenizer.pad_token_id,
+    "eos_token_id": tokenizer.eos_token_id,
+    "use_cache": True
+}
+
+def format_prompt(prompt: str) -> str:
+    """Format prompt properly for Qwen2.5 with system prompt"""
+    return f"<|im_start|>system\n{SYSTEM_PROMPT}<|im_end|>\n<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generation at the next token once the event is set"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+def stream_from_model(prompt: str, stop: threading.Event | None = None):
+    """Yield response text pieces as the model generates them.
+
+    Generation stops early when `stop` is set or the consumer closes the
+    generator, instead of running on to max_new_tokens.
+    """
+    stop = stop or threading.Event()
+    inputs = tokenizer(format_prompt(prompt), return_tensors="pt", padding=True, truncation=True, max_length=4096)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    generation = threading.Thread(
+        target=model.generate,
+        kwargs={
+            **inputs, **GENERATION_KWARGS, "streamer": streamer,
+            "stopping_criteria": StoppingCriteriaList([StopOnEvent(stop)])
+        }
+    )
+    generation.start()
+    try:
+        for text in streamer:
+            yield text
+            if stop.is_set():
+                break
+    finally:
+        stop.set()
+        generation.join()
+
 def generate_from_model(prompt: str):
     """Generate response from Qwen2.5 model with proper configuration"""
     
-    # Add system prompt to establish models identity
-    system_prompt = "You are SAGE, a classroom assistant. You help students and teachers ONLY with their classroom activities and lectures. Provide helpful, educational responses ONLY. If the question is not related to education, apologize and say you cannot answer that as you are a classroom assistant."
-    
-    # Format prompt properly for Qwen2.5 with system prompt
-    formatted_prompt = f"<|im_start|>system\n{system_prompt}<|im_end|>\n<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
+    formatted_prompt = format_prompt(prompt)
     
     # Tokenize input with increased context window
     inputs = tokenizer(formatted_prompt, return_tensors="pt", padding=True, truncation=True, max_length=4096)
@@ -34,15 +88,7 @@ def generate_from_model(prompt: str):
     # Generate with improved parameters for better responses
     outputs = model.generate(
         **inputs,
-        max_new_tokens=1024,
-        do_sample=True,
-        temperature=0.7,
-        top_p=0.95,
-        top_k=40,
-        repetition_penalty=1.02,
-        pad_token_id=tokenizer.pad_token_id,
-        eos_token_id=tokenizer.eos_token_id,
-        use_cache=True,
+        **GENERATION_KWARGS,
         output_scores=False,
         return_dict_in_generate=False
     )
@@ -0,0 +1,147 @@
+# app/core/model_manager.py
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Secondary models unload after this many idle seconds (0 disables unloading)
+DEFAULT_IDLE_SECONDS = 600
+JANITOR_INTERVAL_SECONDS = 30
+
+def _rss_bytes() -> int | None:
+    """Resident set size of this process"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class ManagedModel:
+    """A model loaded on first use, reference-counted while in use, unloaded when idle"""
+
+    def __init__(self, manager, name: str, loader, unloader=None, idle_seconds: float | None = None):
+        self.manager = manager
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.idle_seconds = DEFAULT_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self.model = None
+        self.refcount = 0
+        self.last_used = 0.0
+        self.load_count = 0
+        self.load_seconds = 0.0
+        self.memory_bytes = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def _load(self):
+        # Serialize loads process-wide so RSS deltas are attributable to one model
+        with self.manager.load_lock:
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            self.model = self.loader()
+            self.load_seconds = time.perf_counter() - start
+            rss_after = _rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            self.memory_bytes = max(0, rss_after - rss_before)
+        self.load_count += 1
+        print(f"Loaded {self.name} in {self.load_seconds:.1f}s")
+
+    def acquire(self):
+        with self._lock:
+            if self.model is None:
+                self._load()
+            self.refcount += 1
+            self.last_used = time.monotonic()
+            return self.model
+
+    def release(self):
+        with self._lock:
+            self.refcount = max(0, self.refcount - 1)
+            self.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self):
+        """Hold the model for the duration of a block"""
+        model = self.acquire()
+        try:
+            yield model
+        finally:
+            self.release()
+
+    def unload(self, only_if_idle: bool = False) -> bool:
+        with self._lock:
+            if self.model is None or self.refcount > 0:
+                return False
+            if only_if_idle and (not self.idle_seconds or time.monotonic() - self.last_used < self.idle_seconds):
+                return False
+            model, self.model = self.model, None
+            if self.unloader is not None:
+                self.unloader(model)
+        del model
+        gc.collect()
+        print(f"Unloaded idle model {self.name}")
+        return True
+
+    def status(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "in_use": self.refcount,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.loaded else None,
+            "idle_timeout_seconds": self.idle_seconds,
+            "resident_memory_mb": round(self.memory_bytes / (1024 * 1024), 1) if self.loaded and self.memory_bytes is not None else None,
+            "load_count": self.load_count,
+            "last_load_seconds": round(self.load_seconds, 2)
+        }
+
+class ModelManager:
+    """Registry of secondary models with a background thread unloading idle ones"""
+
+    def __init__(self, interval: float = JANITOR_INTERVAL_SECONDS):
+        self.models: dict[str, ManagedModel] = {}
+        self.load_lock = threading.Lock()
+        self.interval = interval
+        self._janitor = None
+
+    def register(self, name: str, loader, unloader=None, idle_seconds: float | None = None) -> ManagedModel:
+        managed = ManagedModel(self, name, loader, unloader, idle_seconds)
+        self.models[name] = managed
+        self._ensure_janitor()
+        return managed
+
+    def _ensure_janitor(self):
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=self._run_janitor, name="model-janitor", daemon=True)
+            self._janitor.start()
+
+    def _run_janitor(self):
+        while True:
+            time.sleep(self.interval)
+            for managed in list(self.models.values()):
+                try:
+                    managed.unload(only_if_idle=True)
+                except Exception as e:
+                    print(f"Error unloading {managed.name}: {e}")
+
+    def set_idle_timeout(self, name: str, idle_seconds: float):
+        self.models[name].idle_seconds = idle_seconds
+
+    def status(self) -> dict:
+        return {name: managed.status() for name, managed in self.models.items()}
+
+model_manager = ModelManager()
+
+def get_models_status() -> dict:
+    return model_manager.status()
@@ -3,19 +3,59 @@ import faiss
 from sentence_transformers import SentenceTransformer
 import os
 import pickle
+import hashlib
+import re
+import threading
+import time
+from app.core.model_manager import model_manager
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# The embedder loads on first use and unloads when idle. Keeping this lazy
+# also means worker processes that only import the chunking helpers don't
+# each pay for a copy of the model.
+embedder_handle = model_manager.register("embedder", lambda: SentenceTransformer("all-MiniLM-L6-v2"))
 
 # File paths for persistence
 KB_DIR = "knowledge_base"
 FAISS_INDEX_PATH = os.path.join(KB_DIR, "faiss.index")
 TEXTS_PATH = os.path.join(KB_DIR, "texts.pkl")
 PDF_NAMES_PATH = os.path.join(KB_DIR, "pdf_names.pkl")
+HASHES_PATH = os.path.join(KB_DIR, "hashes.pkl")
 
 texts = []
 index = None
 indexed_pdf_names = []
 
+# Content hashes for deduplication
+file_hashes = {}      # file sha256 -> document name
+chunk_hashes = {}     # normalized chunk sha256 -> position in texts
+chunk_sources = []    # position in texts -> list of document names
+
+# Ingests come from upload handlers and the lecture indexer on different
+# threads; one at a time keeps texts, the index and the hashes in step
+_ingest_lock = threading.Lock()
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file on disk without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def normalize_chunk(chunk: str) -> str:
+    """Normalize a chunk so whitespace/case differences don't defeat dedup"""
+    return re.sub(r"\s+", " ", chunk).strip().lower()
+
+def hash_chunk(chunk: str) -> str:
+    return hashlib.sha256(normalize_chunk(chunk).encode("utf-8")).hexdigest()
+
+def find_known_file(file_hash: str) -> str | None:
+    """Return the document name already indexed under this content hash"""
+    return file_hashes.get(file_hash)
+
 def save_knowledge_base():
     os.makedirs(KB_DIR, exist_ok=True)
     if index is not None:
@@ -24,10 +64,24 @@ def save_knowledge_base():
         pickle.dump(texts, f)
     with open(PDF_NAMES_PATH, "wb") as f:
         pickle.dump(indexed_pdf_names, f)
+    with open(HASHES_PATH, "wb") as f:
+        pickle.dump({
+            "file_hashes": file_hashes,
+            "chunk_hashes": chunk_hashes,
+            "chunk_sources": chunk_sources
+        }, f)
     print("Knowledge base saved.")
 
+def _rebuild_chunk_hashes():
+    """Recompute chunk hashes for knowledge bases saved without hashes.pkl"""
+    global chunk_hashes, chunk_sources
+    chunk_hashes = {}
+    for i, chunk in enumerate(texts):
+        chunk_hashes.setdefault(hash_chunk(chunk), i)
+    chunk_sources = [[] for _ in texts]
+
 def load_knowledge_base():
-    global texts, index, indexed_pdf_names
+    global texts, index, indexed_pdf_names, file_hashes, chunk_hashes, chunk_sources
     if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(TEXTS_PATH) and os.path.exists(PDF_NAMES_PATH):
         try:
             index = faiss.read_index(FAISS_INDEX_PATH)
@@ -35,34 +89,126 @@ def load_knowledge_base():
                 texts = pickle.load(f)
             with open(PDF_NAMES_PATH, "rb") as f:
                 indexed_pdf_names = pickle.load(f)
+            if os.path.exists(HASHES_PATH):
+                with open(HASHES_PATH, "rb") as f:
+                    hashes = pickle.load(f)
+                file_hashes = hashes["file_hashes"]
+                chunk_hashes = hashes["chunk_hashes"]
+                chunk_sources = hashes["chunk_sources"]
+            else:
+                file_hashes = {}
+                _rebuild_chunk_hashes()
             print("Knowledge base loaded.")
         except Exception as e:
             print(f"Error loading knowledge base: {e}")
             texts = []
             index = None
             indexed_pdf_names = []
+            file_hashes = {}
+            chunk_hashes = {}
+            chunk_sources = []
     else:
         print("No existing knowledge base found.")
 
-def build_index_from_chunks(chunks: list[str], pdf_name: str):
-    global texts, index, indexed_pdf_names
+def _register_chunks(chunks: list[str], doc_name: str, staged: dict) -> int:
+    """Stage chunk hashes for a document, queueing unseen chunks in staged["texts"].
 
-    # Append new chunks and update PDF names
-    texts.extend(chunks)
-    if pdf_name not in indexed_pdf_names:
-        indexed_pdf_names.append(pdf_name)
+    Nothing global changes here; _commit_staged applies the staged entries
+    once their vectors are in the index. Returns the number of duplicates.
+    """
+    duplicates = 0
+    for chunk in chunks:
+        chunk_hash = hash_chunk(chunk)
+        position = chunk_hashes.get(chunk_hash, staged["hashes"].get(chunk_hash))
+        if position is None:
+            staged["hashes"][chunk_hash] = len(texts) + len(staged["texts"])
+            staged["texts"].append(chunk)
+            staged["sources"].append([doc_name])
+            continue
+        duplicates += 1
+        if position >= len(texts):
+            sources = staged["sources"][position - len(texts)]
+        elif position < len(chunk_sources):
+            sources = staged["shared"].setdefault(position, list(chunk_sources[position]))
+        else:
+            continue
+        if doc_name not in sources:
+            sources.append(doc_name)
+    return duplicates
+
+def _commit_staged(staged: dict):
+    texts.extend(staged["texts"])
+    chunk_hashes.update(staged["hashes"])
+    chunk_sources.extend(staged["sources"])
+    for position, sources in staged["shared"].items():
+        chunk_sources[position] = sources
+    for doc_name in staged["names"]:
+        if doc_name not in indexed_pdf_names:
+            indexed_pdf_names.append(doc_name)
+    file_hashes.update(staged["file_hashes"])
+
+def ingest_documents(documents: list[tuple[str, list[str], str | None]], batch_size: int = 64) -> dict:
+    """Add several documents to the index with a single embedding pass and save.
+
+    `documents` holds (name, chunks, file_hash) tuples. Only chunks not
+    already stored are embedded; they are appended to the existing index.
+    The hashes and names are recorded only once the vectors are added, so
+    a failed encode leaves the knowledge base as it was.
+    """
+    global index
 
-    vectors = np.array(embedder.encode(texts)).astype("float32")
+    with _ingest_lock:
+        staged = {"texts": [], "hashes": {}, "sources": [], "shared": {}, "names": [], "file_hashes": {}}
+        per_document = {}
+        for doc_name, chunks, file_hash in documents:
+            before = len(staged["texts"])
+            duplicates = _register_chunks(chunks, doc_name, staged)
+            # A document without text is only remembered by hash, so it isn't extracted again
+            if chunks:
+                staged["names"].append(doc_name)
+            if file_hash is not None:
+                staged["file_hashes"][file_hash] = doc_name
+            per_document[doc_name] = {
+                "chunks_total": len(chunks),
+                "chunks_added": len(staged["texts"]) - before,
+                "chunks_deduplicated": duplicates,
+                "dedup_ratio": round(duplicates / len(chunks), 3) if chunks else 0.0
+            }
 
-    index = faiss.IndexFlatL2(vectors.shape[1])
-    index.add(vectors)
-    save_knowledge_base() # Save after building/updating index
+        # Embed only the new chunks and append them to the existing index
+        pending = staged["texts"]
+        embed_seconds = 0.0
+        if pending:
+            start = time.perf_counter()
+            with embedder_handle.use() as embedder:
+                vectors = np.array(embedder.encode(pending, batch_size=batch_size)).astype("float32")
+            embed_seconds = time.perf_counter() - start
+            if index is None:
+                index = faiss.IndexFlatL2(vectors.shape[1])
+            index.add(vectors)
+
+        _commit_staged(staged)
+        save_knowledge_base() # Save once after building/updating index
+
+    return {
+        "documents": per_document,
+        "chunks_added": len(pending),
+        "embed_seconds": embed_seconds
+    }
+
+def build_index_from_chunks(chunks: list[str], pdf_name: str, file_hash: str | None = None) -> dict:
+    """Add one document's chunks to the index and return its dedup stats"""
+    result = ingest_documents([(pdf_name, chunks, file_hash)])
+    stats = result["documents"][pdf_name]
+    print(f"Indexed {pdf_name}: {stats}")
+    return stats
 
 def query_with_context(query: str, k: int = 3):
     if index is None:
         return "No knowledge base loaded. Upload a PDF first."
 
-    q_vec = embedder.encode([query])[0].astype("float32")
+    with embedder_handle.use() as embedder:
+        q_vec = embedder.encode([query])[0].astype("float32")
     D, I = index.search(np.array([q_vec]), k=k)
     return " ".join([texts[i] for i in I[0]])
 
@@ -71,7 +217,8 @@ def get_relevant_context(query: str, k: int = 3) -> str:
     if index is None:
         return "No knowledge base loaded. Upload a PDF first."
 
-    q_vec = embedder.encode([query])[0].astype("float32")
+    with embedder_handle.use() as embedder:
+        q_vec = embedder.encode([query])[0].astype("float32")
     D, I = index.search(np.array([q_vec]), k=k)
     
     # Debug: Print what we're retrieving
@@ -100,14 +247,23 @@ def get_relevant_context(query: str, k: int = 3) -> str:
 def get_indexed_pdf_names() -> list[str]:
     return indexed_pdf_names
 
+def get_chunk_sources(position: int) -> list[str]:
+    """Documents that contributed the chunk stored at this position"""
+    if 0 <= position < len(chunk_sources):
+        return chunk_sources[position]
+    return []
+
 def clear_knowledge_base_on_startup():
     """Clear knowledge base files and in-memory data when application starts"""
-    global texts, index, indexed_pdf_names
+    global texts, index, indexed_pdf_names, file_hashes, chunk_hashes, chunk_sources
     
     # Clear in-memory data first
     texts = []
     index = None
     indexed_pdf_names = []
+    file_hashes = {}
+    chunk_hashes = {}
+    chunk_sources = []
     
     # Clear persisted files
     try:
@@ -120,6 +276,9 @@ def clear_knowledge_base_on_startup():
         if os.path.exists(PDF_NAMES_PATH):
             os.remove(PDF_NAMES_PATH)
             print(f"Removed {PDF_NAMES_PATH}")
+        if os.path.exists(HASHES_PATH):
+            os.remove(HASHES_PATH)
+            print(f"Removed {HASHES_PATH}")
         print("Knowledge base completely cleared - both memory and files")
     except Exception as e:
         print(f"Error clearing knowledge base on startup: {e}")
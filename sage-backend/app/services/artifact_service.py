@@ -0,0 +1,170 @@
+# app/services/artifact_service.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# How often the janitor enforces quotas
+JANITOR_INTERVAL_SECONDS = 60
+
+# Generated files under static/: directory, size quota, age quota, file pattern
+ARTIFACT_QUOTAS = {
+    'attendance': {
+        'directory': os.path.join("static", "attendance"),
+        'max_bytes': 500 * 1024 * 1024,
+        'max_age_seconds': 7 * 24 * 3600,
+        'pattern': r"^attendance_.*\.jpg$"
+    },
+    'exports': {
+        'directory': os.path.join("static", "exports"),
+        'max_bytes': 200 * 1024 * 1024,
+        'max_age_seconds': 30 * 24 * 3600,
+        'pattern': r"^attendance_export_.*\.(json|csv|ndjson)$"
+    },
+    # Charts from utils.maybe_generate_visual, as <uuid>.png
+    'charts': {
+        'directory': os.path.join("static", "charts"),
+        'max_bytes': 50 * 1024 * 1024,
+        'max_age_seconds': 24 * 3600,
+        'pattern': r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.png$"
+    }
+}
+
+class ArtifactDirectory:
+    """In-memory index of generated files in one directory, oldest first.
+
+    The directory is scanned once; after that writers report new files with
+    add(), so enforcing the quotas only touches the files it evicts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age_seconds: float, pattern: str):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.pattern = re.compile(pattern)
+        self.entries = OrderedDict()  # filename -> (size, created), oldest first
+        self.total_bytes = 0
+        self.evicted = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and self.pattern.match(entry.name):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for created, name, size in sorted(found):
+            self.entries[name] = (size, created)
+            self.total_bytes += size
+        self._loaded = True
+
+    def add(self, filename: str, size: int | None = None):
+        """Record a file just written to this directory"""
+        if size is None:
+            size = os.path.getsize(os.path.join(self.directory, filename))
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            old = self.entries.pop(filename, None)
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.entries[filename] = (size, time.time())
+            self.total_bytes += size
+
+    def enforce(self) -> int:
+        """Evict the oldest files past the size or age quota; returns how many"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            cutoff = time.time() - self.max_age_seconds
+            evicted = 0
+            while self.entries:
+                name, (size, created) = next(iter(self.entries.items()))
+                if self.total_bytes <= self.max_bytes and created >= cutoff:
+                    break
+                self.entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                evicted += 1
+            self.evicted += evicted
+            return evicted
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "evicted": self.evicted
+        }
+
+class ArtifactJanitor:
+    """Single background thread enforcing the quotas of every registered store.
+
+    A store is anything with enforce() and stats(): artifact directories
+    here, and caches that keep their own index (such as the TTS audio cache).
+    """
+
+    def __init__(self, interval: float = JANITOR_INTERVAL_SECONDS):
+        self.stores = {}
+        self.interval = interval
+        self.runs = 0
+        self.last_run_seconds = 0.0
+        self._janitor = None
+        self._run_lock = threading.Lock()
+
+    def register(self, name: str, store):
+        self.stores[name] = store
+        self._ensure_janitor()
+        return store
+
+    def _ensure_janitor(self):
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=self._run_janitor, name="artifact-janitor", daemon=True)
+            self._janitor.start()
+
+    def _run_janitor(self):
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self) -> dict:
+        """Enforce every store's quotas now; returns files evicted per store"""
+        with self._run_lock:
+            start = time.perf_counter()
+            evicted = {}
+            for name, store in list(self.stores.items()):
+                try:
+                    evicted[name] = store.enforce()
+                except Exception as e:
+                    print(f"Error cleaning up {name}: {e}")
+            self.runs += 1
+            self.last_run_seconds = time.perf_counter() - start
+            return evicted
+
+    def status(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_run_ms": round(1000 * self.last_run_seconds, 2),
+            "stores": {name: store.stats() for name, store in self.stores.items()}
+        }
+
+artifact_janitor = ArtifactJanitor()
+artifacts = {
+    name: artifact_janitor.register(name, ArtifactDirectory(**quota))
+    for name, quota in ARTIFACT_QUOTAS.items()
+}
+
+def record_artifact(kind: str, path: str, size: int | None = None):
+    """Tell the janitor about a file just written for one of the ARTIFACT_QUOTAS kinds"""
+    artifacts[kind].add(os.path.basename(path), size)
+
+def get_artifact_status() -> dict:
+    return artifact_janitor.status()
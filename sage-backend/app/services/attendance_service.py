@@ -3,102 +3,92 @@ import cv2
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import os
-from datetime import datetime
-import json
+import statistics
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app.core.model_manager import model_manager
+from app.services.image_preprocessing import PreparedImage
+from app.services.artifact_service import record_artifact
+from app.services.attendance_store import attendance_store, iter_export
+from app.services.face_detection import DetectorPool, FACE_DETECTOR_SETTINGS
+from app.services.attendance_workers import init_batch_worker, detect_photos, detect_video
 
-# Thread pool for CPU-intensive operations
-executor = ThreadPoolExecutor(max_workers=2)
+# Thread pool for CPU-intensive operations (one face detector per thread)
+executor = ThreadPoolExecutor(max_workers=FACE_DETECTOR_SETTINGS['pool_size'])
+
+# Multi-frame attendance (photo bursts and short videos)
+BATCH_ATTENDANCE_SETTINGS = {
+    'sample_fps': 1.0,      # Video frames analysed per second of footage
+    'max_frames': 120,      # Cap on analysed frames per request
+    'batch_size': 8,        # Frames per DNN forward pass
+    'workers': max(1, min(4, (os.cpu_count() or 2) - 1)),
+    'aggregate': 'median'   # Headcount recorded for the batch: 'median' or 'max'
+}
+
+# Live webcam attendance over a websocket
+STREAM_ATTENDANCE_SETTINGS = {
+    'detect_every': 10,     # Run the detector on every Nth frame; track in between
+    'max_width': 640,       # Detection input width for stream frames
+    'iou_threshold': 0.3,   # Minimum overlap to match a detection to a track
+    'min_hits': 2,          # Detections before a face counts towards the headcount
+    'max_missed': 3         # Detection passes a face may be missed before it is dropped
+}
+
+# Tiled detection for wide, high-resolution classroom photos
+TILED_DETECTION_SETTINGS = {
+    'tile_size': 600,       # Tile side in pixels; the DNN sees each tile at 300x300
+    'overlap': 0.25,        # Fraction of a tile shared with its neighbour
+    'max_side': 4000,       # Larger photos are scaled down first to bound the tile count
+    'nms_threshold': 0.5    # Overlap (of the smaller box) above which detections are merged
+}
+
+# Decode and detection for batches run in worker processes, each with its own detector.
+# Spawned, not forked: the parent may hold OpenVINO/OpenCV thread pools. Workers only
+# import attendance_workers, not this module and its janitor/store side effects
+batch_executor = ProcessPoolExecutor(
+    max_workers=BATCH_ATTENDANCE_SETTINGS['workers'],
+    mp_context=multiprocessing.get_context("spawn"),
+    initializer=init_batch_worker
+)
 
 class AttendanceTracker:
     def __init__(self):
-        # Load OpenCV's pre-trained face detection model
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        # Alternative: DNN face detection (more accurate)
-        try:
-            # Load DNN model for better face detection
-            model_path = cv2.dnn.DNN_BACKEND_OPENCV
-            self.net = cv2.dnn.readNetFromTensorflow(
-                cv2.samples.findFile("opencv_face_detector_uint8.pb"),
-                cv2.samples.findFile("opencv_face_detector.pbtxt")
-            )
-            self.use_dnn = True
-            print("Using DNN face detection (more accurate)")
-        except:
-            self.use_dnn = False
-            print("Using Haar Cascade face detection")
-        
-        self.attendance_records = []
+        self.detection_method = 'Haar Cascade'
+        # Records persist in SQLite across restarts
+        self.store = attendance_store
         
-    def detect_faces_haar(self, image: np.ndarray) -> Tuple[int, List[Dict]]:
-        """Detect faces using Haar Cascade (basic but reliable)"""
-        try:
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
-            
-            face_list = []
-            for (x, y, w, h) in faces:
-                face_list.append({
-                    'bbox': [int(x), int(y), int(w), int(h)],
-                    'confidence': 0.8  # Haar cascade doesn't provide confidence
-                })
-            
-            return len(faces), face_list
-            
-        except Exception as e:
-            print(f"Haar face detection error: {e}")
-            return 0, []
+        # Face detectors load on first use and unload when idle; records stay
+        self.detector_handle = model_manager.register(
+            "face_detector", self._load_detectors, self._unload_detectors
+        )
     
-    def detect_faces_dnn(self, image: np.ndarray) -> Tuple[int, List[Dict]]:
-        """Detect faces using DNN (more accurate)"""
-        try:
-            h, w = image.shape[:2]
-            
-            # Create blob from image
-            blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300), [104, 117, 123])
-            self.net.setInput(blob)
-            detections = self.net.forward()
-            
-            faces = []
-            for i in range(detections.shape[2]):
-                confidence = detections[0, 0, i, 2]
-                
-                # Filter out weak detections
-                if confidence > 0.5:
-                    x1 = int(detections[0, 0, i, 3] * w)
-                    y1 = int(detections[0, 0, i, 4] * h)
-                    x2 = int(detections[0, 0, i, 5] * w)
-                    y2 = int(detections[0, 0, i, 6] * h)
-                    
-                    faces.append({
-                        'bbox': [x1, y1, x2-x1, y2-y1],
-                        'confidence': float(confidence)
-                    })
-            
-            return len(faces), faces
-            
-        except Exception as e:
-            print(f"DNN face detection error: {e}")
-            # Fallback to Haar cascade
-            return self.detect_faces_haar(image)
+    @property
+    def use_dnn(self) -> bool:
+        return self.detection_method != 'Haar Cascade'
+    
+    def _load_detectors(self) -> DetectorPool:
+        # One detector per executor thread; a shared cv2.dnn Net is not thread-safe
+        pool = DetectorPool(size=FACE_DETECTOR_SETTINGS['pool_size'])
+        self.detection_method = pool.method
+        return pool
+    
+    def _unload_detectors(self, _pool):
+        pass
     
     def detect_faces_in_frame(self, image: np.ndarray) -> Tuple[int, List[Dict]]:
         """Main face detection function"""
-        if self.use_dnn:
-            return self.detect_faces_dnn(image)
-        else:
-            return self.detect_faces_haar(image)
+        with self.detector_handle.use() as pool, pool.detector() as detector:
+            return detector.detect(image)
+    
+    def detect_faces_in_frames(self, images: List[np.ndarray]) -> List[Tuple[int, List[Dict]]]:
+        """Face detection for a batch of frames"""
+        with self.detector_handle.use() as pool, pool.detector() as detector:
+            return detector.detect_batch(images)
     
     def draw_detections(self, image: np.ndarray, faces: List[Dict]) -> np.ndarray:
         """Draw bounding boxes around detected faces"""
@@ -150,7 +140,7 @@ class AttendanceTracker:
         )
         
         # Add detection method info
-        method_text = "Detection: DNN" if self.use_dnn else "Detection: Haar Cascade"
+        method_text = f"Detection: {self.detection_method}"
         cv2.putText(
             annotated_image,
             method_text,
@@ -163,7 +153,8 @@ class AttendanceTracker:
         
         return annotated_image
     
-    def record_attendance(self, count: int, timestamp: Optional[str] = None) -> Dict:
+    def record_attendance(self, count: int, timestamp: Optional[str] = None, detection_method: Optional[str] = None,
+                          class_id: Optional[str] = None) -> Dict:
         """Record attendance count with timestamp"""
         if timestamp is None:
             timestamp = datetime.now().isoformat()
@@ -171,16 +162,17 @@ class AttendanceTracker:
         record = {
             'timestamp': timestamp,
             'headcount': count,
-            'session_id': datetime.now().strftime("%Y%m%d_%H%M%S"),
-            'detection_method': 'DNN' if self.use_dnn else 'Haar Cascade'
+            # Timestamp plus a random suffix: several records can land in the same second
+            'session_id': f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+            'detection_method': detection_method or self.detection_method,
+            'class_id': class_id
         }
         
-        self.attendance_records.append(record)
-        return record
+        return self.store.add(record)
     
     def get_attendance_summary(self, last_n: int = 10) -> Dict:
         """Get attendance summary for last N records"""
-        recent_records = self.attendance_records[-last_n:] if self.attendance_records else []
+        recent_records = self.store.recent(last_n)
         
         if not recent_records:
             return {
@@ -204,64 +196,265 @@ class AttendanceTracker:
 # Global tracker instance
 attendance_tracker = AttendanceTracker()
 
-def _process_image_sync(image_data: bytes) -> Tuple[int, List[Dict], Optional[bytes]]:
-    """Synchronous image processing"""
+async def record_attendance_async(count: int, detection_method: Optional[str] = None,
+                                  class_id: Optional[str] = None) -> Dict:
+    """record_attendance for async callers; the SQLite write stays off the event loop"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, lambda: attendance_tracker.record_attendance(count, detection_method=detection_method, class_id=class_id)
+    )
+
+def _annotate_sync(image: np.ndarray, faces: List[Dict], max_width: int = 1600) -> bytes:
+    """Draw detections and JPEG-encode, scaling large images down first"""
+    if image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        image = cv2.resize(image, (max_width, int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        faces = [{**face, 'bbox': [int(v * scale) for v in face['bbox']]} for face in faces]
+    
+    # Draw annotations
+    annotated_image = attendance_tracker.draw_detections(image, faces)
+    
+    # Encode annotated image back to bytes
+    _, buffer = cv2.imencode('.jpg', annotated_image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes()
+
+def _decode_standard(image_data: bytes) -> Optional[np.ndarray]:
+    # Decode via the shared pipeline (EXIF-oriented, resized before conversion to BGR)
     try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
+        return PreparedImage(image_data).bgr(max_width=1024)
+    except Exception:
+        return None
+
+def _process_image_sync(image_data: bytes) -> Optional[Tuple[int, List[Dict]]]:
+    """Synchronous image processing; None if the image can't be decoded"""
+    try:
+        image = _decode_standard(image_data)
         if image is None:
-            return 0, [], None
-        
-        # Resize image if too large (for better performance)
-        height, width = image.shape[:2]
-        if width > 1024:
-            scale = 1024 / width
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            image = cv2.resize(image, (new_width, new_height))
+            return None
         
         # Detect faces
-        count, faces = attendance_tracker.detect_faces_in_frame(image)
-        
-        # Draw annotations
-        annotated_image = attendance_tracker.draw_detections(image, faces)
-        
-        # Encode annotated image back to bytes
-        _, buffer = cv2.imencode('.jpg', annotated_image, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        annotated_bytes = buffer.tobytes()
-        
-        return count, faces, annotated_bytes
+        return attendance_tracker.detect_faces_in_frame(image)
         
     except Exception as e:
         print(f"Image processing error: {e}")
-        return 0, [], None
+        return None
 
-async def process_attendance_image(image_data: bytes) -> Dict:
-    """Process uploaded image for attendance counting"""
+def _decode_for_tiling(image_data: bytes) -> Optional[np.ndarray]:
+    try:
+        prepared = PreparedImage(image_data)
+        width, height = prepared.size
+        max_side = TILED_DETECTION_SETTINGS['max_side']
+        max_width = int(width * max_side / max(width, height)) if max(width, height) > max_side else None
+        return prepared.bgr(max_width=max_width)
+    except Exception:
+        return None
+
+def _tile_origins(length: int, tile: int, step: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+def _tile_image(image: np.ndarray) -> List[Tuple[int, int, np.ndarray]]:
+    """Overlapping (x, y, tile) views covering the image"""
+    tile = TILED_DETECTION_SETTINGS['tile_size']
+    step = max(1, int(tile * (1 - TILED_DETECTION_SETTINGS['overlap'])))
+    h, w = image.shape[:2]
+    return [
+        (x, y, image[y:y + tile, x:x + tile])
+        for y in _tile_origins(h, tile, step)
+        for x in _tile_origins(w, tile, step)
+    ]
+
+def _touches_inner_edge(bbox: List[int], x: int, y: int, tile: np.ndarray, image_shape, margin: int = 2) -> bool:
+    """A box cut by a tile border that isn't an image border; a neighbouring tile sees it whole"""
+    bx, by, bw, bh = bbox
+    th, tw = tile.shape[:2]
+    h, w = image_shape[:2]
+    return ((bx <= margin and x > 0) or (by <= margin and y > 0)
+            or (bx + bw >= tw - margin and x + tw < w) or (by + bh >= th - margin and y + th < h))
+
+def suppress_overlapping_faces(faces: List[Dict], threshold: float) -> List[Dict]:
+    """Greedy NMS by confidence, measuring overlap against the smaller box so
+    a partial face from one tile is merged into the full face from another"""
+    if not faces:
+        return []
+    faces = sorted(faces, key=lambda face: face['confidence'], reverse=True)
+    boxes = np.array([face['bbox'] for face in faces], dtype=float)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = np.maximum(boxes[:, 2] * boxes[:, 3], 1.0)
+    keep = []
+    suppressed = np.zeros(len(faces), dtype=bool)
+    for i in range(len(faces)):
+        if suppressed[i]:
+            continue
+        keep.append(faces[i])
+        inter_w = np.clip(np.minimum(x2[i], x2) - np.maximum(x1[i], x1), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2) - np.maximum(y1[i], y1), 0, None)
+        overlap = inter_w * inter_h / np.minimum(areas[i], areas)
+        suppressed |= overlap > threshold
+    return keep
+
+async def detect_faces_tiled(image: np.ndarray) -> Tuple[int, List[Dict]]:
+    """Detect small faces in a large image by running the detector on overlapping tiles.
+
+    Tiles are split across the detector pool and run in parallel; a
+    downscaled whole-image pass catches faces larger than a tile. Results are
+    shifted to image coordinates and merged with NMS.
+    """
+    loop = asyncio.get_event_loop()
+    tiles = _tile_image(image)
+    groups = _split(tiles, FACE_DETECTOR_SETTINGS['pool_size'])
+    # The whole-image pass only needs to find large faces; run it at standard resolution
+    whole_scale = min(1.0, 1024 / image.shape[1])
+    whole_image = image if whole_scale == 1.0 else cv2.resize(
+        image, (1024, int(image.shape[0] * whole_scale)), interpolation=cv2.INTER_AREA
+    )
+    whole_pass = loop.run_in_executor(executor, attendance_tracker.detect_faces_in_frame, whole_image)
+    tile_passes = [
+        loop.run_in_executor(executor, attendance_tracker.detect_faces_in_frames, [tile for _, _, tile in group])
+        for group in groups
+    ]
+    (_, whole_faces), *group_results = await asyncio.gather(whole_pass, *tile_passes)
+    
+    faces = [{**face, 'bbox': [int(v / whole_scale) for v in face['bbox']]} for face in whole_faces]
+    for group, results in zip(groups, group_results):
+        for (x, y, tile), (_, tile_faces) in zip(group, results):
+            for face in tile_faces:
+                if _touches_inner_edge(face['bbox'], x, y, tile, image.shape):
+                    continue
+                bx, by, bw, bh = face['bbox']
+                faces.append({**face, 'bbox': [bx + x, by + y, bw, bh]})
+    
+    faces = suppress_overlapping_faces(faces, TILED_DETECTION_SETTINGS['nms_threshold'])
+    return len(faces), faces
+
+async def _process_image_tiled(image_data: bytes) -> Optional[Tuple[int, List[Dict]]]:
+    loop = asyncio.get_event_loop()
+    image = await loop.run_in_executor(executor, _decode_for_tiling, image_data)
+    if image is None:
+        return None
+    return await detect_faces_tiled(image)
+
+class PendingAnnotations:
+    """Uploads whose annotated image has not been rendered yet.
+
+    Holds the original (compressed) upload and its detections, so the
+    image is only decoded and drawn again if someone actually asks for it.
+    Bounded by total bytes, dropping the oldest first.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # session id -> (image bytes, faces, mode)
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, image_data: bytes, faces: List[Dict], mode: str):
+        with self._lock:
+            self.discard(session_id, locked=True)
+            self.entries[session_id] = (image_data, faces, mode)
+            self.total_bytes += len(image_data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (old_data, _, _) = self.entries.popitem(last=False)
+                self.total_bytes -= len(old_data)
+
+    def get(self, session_id: str):
+        with self._lock:
+            return self.entries.get(session_id)
+
+    def discard(self, session_id: str, locked: bool = False):
+        if not locked:
+            with self._lock:
+                return self.discard(session_id, locked=True)
+        entry = self.entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[0])
+
+ANNOTATION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+pending_annotations = PendingAnnotations(ANNOTATION_CACHE_MAX_BYTES)
+# Renders in progress, so concurrent requests for one image share the work
+_rendering: Dict[str, asyncio.Future] = {}
+_background_renders = set()
+
+def annotation_path(session_id: str) -> str:
+    return os.path.join("static", "attendance", f"attendance_{session_id}.jpg")
+
+def _render_annotation_sync(session_id: str, image_data: bytes, faces: List[Dict], mode: str) -> Optional[str]:
+    image = _decode_for_tiling(image_data) if mode == "tiled" else _decode_standard(image_data)
+    if image is None:
+        return None
+    annotated_bytes = _annotate_sync(image, faces)
+    path = annotation_path(session_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(annotated_bytes)
+    record_artifact("attendance", path, len(annotated_bytes))
+    return path
+
+async def render_annotation(session_id: str) -> Optional[str]:
+    """Path of the annotated image for a session, rendering it on first request"""
+    path = annotation_path(session_id)
+    if os.path.exists(path):
+        pending_annotations.discard(session_id)
+        return path
+    
+    rendering = _rendering.get(session_id)
+    if rendering is not None:
+        return await asyncio.shield(rendering)
+    
+    pending = pending_annotations.get(session_id)
+    if pending is None:
+        return None
+    
+    loop = asyncio.get_event_loop()
+    rendering = _rendering[session_id] = loop.create_future()
+    path = None
+    try:
+        path = await loop.run_in_executor(executor, _render_annotation_sync, session_id, *pending)
+        pending_annotations.discard(session_id)
+    finally:
+        rendering.set_result(path)
+        del _rendering[session_id]
+    return path
+
+async def process_attendance_image(image_data: bytes, mode: str = "standard", annotate: str = "lazy",
+                                   class_id: Optional[str] = None) -> Dict:
+    """Process uploaded image for attendance counting.
+
+    mode "tiled" detects on overlapping full-resolution tiles, for wide
+    lecture-hall photos where back-row faces are too small at 1024 px.
+    annotate "lazy" renders the annotated image when it is first fetched,
+    "background" renders it right away off the request path, and "none"
+    skips it for callers that only want the count.
+    """
     try:
         loop = asyncio.get_event_loop()
-        count, faces, annotated_bytes = await loop.run_in_executor(
-            executor,
-            _process_image_sync,
-            image_data
-        )
+        if mode == "tiled":
+            detected = await _process_image_tiled(image_data)
+        else:
+            detected = await loop.run_in_executor(
+                executor,
+                _process_image_sync,
+                image_data
+            )
+        count, faces = detected if detected is not None else (0, [])
         
         # Record attendance
-        record = attendance_tracker.record_attendance(count)
+        record = await record_attendance_async(count, class_id=class_id)
         
-        # Save annotated image
-        annotated_path = None
-        if annotated_bytes:
-            filename = f"attendance_{record['session_id']}.jpg"
-            annotated_path = os.path.join("static", "attendance", filename)
-            os.makedirs(os.path.dirname(annotated_path), exist_ok=True)
-            
-            with open(annotated_path, 'wb') as f:
-                f.write(annotated_bytes)
-            
-            annotated_path = f"/static/attendance/{filename}"
+        # Annotated image is produced later (or never), not on the request path;
+        # the endpoint turns annotation_id into the image route's URL
+        annotation_id = None
+        if detected is not None and annotate != "none":
+            annotation_id = record['session_id']
+            pending_annotations.put(annotation_id, image_data, faces, mode)
+            if annotate == "background":
+                task = asyncio.create_task(render_annotation(record['session_id']))
+                _background_renders.add(task)
+                task.add_done_callback(_background_renders.discard)
         
         return {
             'headcount': count,
@@ -269,7 +462,8 @@ async def process_attendance_image(image_data: bytes) -> Dict:
             'timestamp': record['timestamp'],
             'session_id': record['session_id'],
             'detection_method': record['detection_method'],
-            'annotated_image_url': annotated_path
+            'annotation_id': annotation_id,
+            'annotated_image_url': None
         }
         
     except Exception as e:
@@ -284,30 +478,145 @@ async def process_attendance_image(image_data: bytes) -> Dict:
             'error': str(e)
         }
 
+def _video_sample_plan(video_path: str, sample_fps: float, max_frames: int) -> Tuple[float, List[int]]:
+    """Frame rate and the frame indices to analyse"""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Could not open video")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        capture.release()
+    step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+    if frame_count <= 0:
+        # Unknown length (e.g. some webm files): sample until the decoder runs out
+        frame_count = step * max_frames
+    return fps, list(range(0, frame_count, step))[:max_frames]
+
+def _split(items: list, parts: int) -> List[list]:
+    """Split into at most `parts` contiguous, similarly sized runs"""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    runs, start = [], 0
+    for part in range(parts):
+        end = start + size + (1 if part < extra else 0)
+        runs.append(items[start:end])
+        start = end
+    return runs
+
+def _aggregate_headcount(counts: List[int], aggregate: str) -> Dict:
+    if not counts:
+        return {'headcount': 0, 'median_headcount': 0, 'max_headcount': 0, 'mean_headcount': 0.0}
+    median = int(round(statistics.median(counts)))
+    maximum = max(counts)
+    return {
+        'headcount': maximum if aggregate == 'max' else median,
+        'median_headcount': median,
+        'max_headcount': maximum,
+        'mean_headcount': round(sum(counts) / len(counts), 2)
+    }
+
+async def process_attendance_batch(photos: List[bytes] = None, video_path: str = None,
+                                   sample_fps: float = None, aggregate: str = None,
+                                   class_id: Optional[str] = None) -> Dict:
+    """Headcount from a burst of photos or a short video.
+
+    Frames are split across the process pool; each worker decodes its share
+    and runs the face DNN on batched blobs. The recorded headcount is the
+    median (robust to a frame where people are hidden) or the max across frames.
+    """
+    sample_fps = BATCH_ATTENDANCE_SETTINGS['sample_fps'] if sample_fps is None else sample_fps
+    aggregate = aggregate or BATCH_ATTENDANCE_SETTINGS['aggregate']
+    max_frames = BATCH_ATTENDANCE_SETTINGS['max_frames']
+    workers = BATCH_ATTENDANCE_SETTINGS['workers']
+    loop = asyncio.get_event_loop()
+    
+    frames = []
+    if video_path is not None:
+        fps, indices = await loop.run_in_executor(executor, _video_sample_plan, video_path, sample_fps, max_frames)
+        runs = await asyncio.gather(*[
+            loop.run_in_executor(batch_executor, detect_video, video_path, run, BATCH_ATTENDANCE_SETTINGS['batch_size'])
+            for run in _split(indices, workers)
+        ])
+        for run, _ in runs:
+            for index, count, faces in run:
+                frames.append({'frame': index, 'time': round(index / fps, 2), 'headcount': count, 'faces': faces})
+    else:
+        photos = (photos or [])[:max_frames]
+        groups = _split(photos, workers)
+        runs = await asyncio.gather(*[
+            loop.run_in_executor(batch_executor, detect_photos, group, BATCH_ATTENDANCE_SETTINGS['batch_size'])
+            for group in groups
+        ])
+        position = 0
+        for run, _ in runs:
+            for result in run:
+                if result is not None:
+                    count, faces = result
+                    frames.append({'frame': position, 'headcount': count, 'faces': faces})
+                position += 1
+    
+    if not frames:
+        raise ValueError("No frames could be decoded")
+    
+    summary = _aggregate_headcount([frame['headcount'] for frame in frames], aggregate)
+    # Detection ran in the workers, so report the method they used
+    method = runs[0][1] if runs else attendance_tracker.detection_method
+    record = await record_attendance_async(summary['headcount'], detection_method=method, class_id=class_id)
+    return {
+        **summary,
+        'aggregate': aggregate,
+        'frames_analyzed': len(frames),
+        'frames': frames,
+        'timestamp': record['timestamp'],
+        'session_id': record['session_id'],
+        'detection_method': record['detection_method']
+    }
+
+def _detect_stream_frame_sync(image_data: bytes) -> Optional[List[List[int]]]:
+    """Face boxes of one stream frame in original-image pixels (None if undecodable)"""
+    try:
+        prepared = PreparedImage(image_data)
+        image = prepared.bgr(max_width=STREAM_ATTENDANCE_SETTINGS['max_width'])
+    except Exception:
+        return None
+    _, faces = attendance_tracker.detect_faces_in_frame(image)
+    scale = prepared.size[0] / image.shape[1]
+    return [[int(v * scale) for v in face['bbox']] for face in faces]
+
+async def detect_stream_frame(image_data: bytes) -> Optional[List[List[int]]]:
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, _detect_stream_frame_sync, image_data)
+
 async def get_attendance_stats() -> Dict:
-    """Get attendance statistics"""
-    return attendance_tracker.get_attendance_summary()
+    """Get attendance statistics, with the last week's daily and last month's weekly aggregates"""
+    def stats():
+        today = datetime.now().date()
+        return {
+            **attendance_tracker.get_attendance_summary(),
+            'daily': attendance_store.aggregates('day', start=(today - timedelta(days=6)).isoformat()),
+            'weekly': attendance_store.aggregates('week', start=(today - timedelta(weeks=3)).isoformat())
+        }
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, stats)
 
-def export_attendance_data() -> str:
-    """Export attendance data to JSON file"""
+def export_attendance_data(export_format: str = "csv", start: Optional[str] = None, end: Optional[str] = None,
+                           class_id: Optional[str] = None) -> str:
+    """Export attendance records to a CSV or NDJSON file, streamed from the store"""
     try:
-        filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
         filepath = os.path.join("static", "exports", filename)
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        data = {
-            'export_timestamp': datetime.now().isoformat(),
-            'total_records': len(attendance_tracker.attendance_records),
-            'detection_method': 'DNN' if attendance_tracker.use_dnn else 'Haar Cascade',
-            'records': attendance_tracker.attendance_records,
-            'summary': attendance_tracker.get_attendance_summary()
-        }
-        
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        records = attendance_store.iter_records(start, end, class_id)
+        with open(filepath, 'w', newline='') as f:
+            for chunk in iter_export(records, export_format):
+                f.write(chunk)
+        record_artifact("exports", filepath)
         
         return f"/static/exports/{filename}"
         
     except Exception as e:
         print(f"Export error: {e}")
-        return None
\ No newline at end of file
+        return None
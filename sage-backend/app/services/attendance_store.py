@@ -0,0 +1,231 @@
+# app/services/attendance_store.py
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+ATTENDANCE_DB_PATH = os.path.join("attendance_data", "attendance.db")
+
+# Rows fetched per round trip when streaming records out
+EXPORT_FETCH_ROWS = 1000
+
+RECORD_FIELDS = ('timestamp', 'session_id', 'class_id', 'headcount', 'detection_method')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_records (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    session_id TEXT,
+    class_id TEXT,
+    headcount INTEGER NOT NULL,
+    detection_method TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_timestamp ON attendance_records (timestamp);
+CREATE INDEX IF NOT EXISTS idx_records_session ON attendance_records (session_id);
+CREATE INDEX IF NOT EXISTS idx_records_class ON attendance_records (class_id, timestamp);
+
+-- One row per period, period start and class ('' for records without a class)
+CREATE TABLE IF NOT EXISTS attendance_aggregates (
+    period TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    class_id TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    min_headcount INTEGER NOT NULL,
+    max_headcount INTEGER NOT NULL,
+    PRIMARY KEY (period, period_start, class_id)
+);
+"""
+
+UPSERT_AGGREGATE = """
+INSERT INTO attendance_aggregates (period, period_start, class_id, records, total, min_headcount, max_headcount)
+VALUES (?, ?, ?, 1, ?, ?, ?)
+ON CONFLICT (period, period_start, class_id) DO UPDATE SET
+    records = records + 1,
+    total = total + excluded.total,
+    min_headcount = MIN(min_headcount, excluded.min_headcount),
+    max_headcount = MAX(max_headcount, excluded.max_headcount)
+"""
+
+PERIODS = ('day', 'week')
+
+def period_start(timestamp: str, period: str) -> str:
+    """Date the day or (Monday-starting) week of an ISO timestamp begins on"""
+    day = datetime.fromisoformat(timestamp).date()
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+def period_end(bound: str, period: str) -> str:
+    """First period start at or after an ISO bound, so `period_start < it` keeps [start, bound)"""
+    moment = datetime.fromisoformat(bound)
+    day = moment.date()
+    if moment.time() != datetime.min.time():
+        day += timedelta(days=1)
+    if period == 'week' and day.weekday():
+        day += timedelta(days=7 - day.weekday())
+    return day.isoformat()
+
+def normalize_bound(value: Optional[str]) -> Optional[str]:
+    """Validate an ISO date/datetime range bound; raises ValueError"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).isoformat()
+
+def _range_clause(start: Optional[str], end: Optional[str], class_id: Optional[str], column: str = "timestamp"):
+    clauses, params = [], []
+    if class_id is not None:
+        clauses.append("class_id = ?")
+        params.append(class_id)
+    if start:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+class AttendanceStore:
+    """Attendance records in SQLite, with daily and weekly aggregates.
+
+    Each insert also folds the headcount into its day and week rows of
+    attendance_aggregates in the same transaction, so summaries never scan
+    the records. Range bounds are ISO dates or datetimes, start inclusive
+    and end exclusive, and are answered from the indexes.
+    """
+
+    def __init__(self, path: str = ATTENDANCE_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets exports read while uploads keep writing
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = self._connect()
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def add(self, record: Dict) -> Dict:
+        class_id = record.get('class_id')
+        headcount = int(record['headcount'])
+        with self._lock:
+            conn = self._writer()
+            with conn:
+                conn.execute(
+                    "INSERT INTO attendance_records (timestamp, session_id, class_id, headcount, detection_method)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (record['timestamp'], record.get('session_id'), class_id, headcount, record.get('detection_method'))
+                )
+                for period in PERIODS:
+                    conn.execute(UPSERT_AGGREGATE, (
+                        period, period_start(record['timestamp'], period), class_id or '',
+                        headcount, headcount, headcount
+                    ))
+        return record
+
+    def _query(self, sql: str, params: List) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._writer().execute(sql, params).fetchall()]
+
+    def recent(self, limit: int = 10) -> List[Dict]:
+        """Latest records, oldest first"""
+        rows = self._query(
+            f"SELECT {', '.join(RECORD_FIELDS)} FROM attendance_records ORDER BY id DESC LIMIT ?", [limit]
+        )
+        return rows[::-1]
+
+    def records(self, start: Optional[str] = None, end: Optional[str] = None, class_id: Optional[str] = None,
+                session_id: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+        where, params = _range_clause(start, end, class_id)
+        if session_id is not None:
+            where += (" AND " if where else " WHERE ") + "session_id = ?"
+            params.append(session_id)
+        return self._query(
+            f"SELECT {', '.join(RECORD_FIELDS)} FROM attendance_records{where} ORDER BY timestamp LIMIT ?",
+            params + [limit]
+        )
+
+    def aggregates(self, period: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                   class_id: Optional[str] = None) -> List[Dict]:
+        """Average, min and max headcount per day or week.
+
+        Without a class_id the per-class rows are combined, which is exact:
+        totals and counts add up, and min/max of mins/maxes are the min/max.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+        # Periods are keyed by their start date: widen the lower bound to the period containing
+        # it, and round the (exclusive) upper bound up to the next period start
+        start = period_start(start, period) if start else None
+        end = period_end(end, period) if end else None
+        where, params = _range_clause(start, end, class_id, column="period_start")
+        where += (" AND " if where else " WHERE ") + "period = ?"
+        params.append(period)
+        rows = self._query(
+            "SELECT period_start, SUM(records) AS records, SUM(total) AS total,"
+            " MIN(min_headcount) AS min_attendance, MAX(max_headcount) AS max_attendance"
+            f" FROM attendance_aggregates{where} GROUP BY period_start ORDER BY period_start",
+            params
+        )
+        return [{
+            'period': period,
+            'period_start': row['period_start'],
+            'records': row['records'],
+            'average_attendance': row['total'] / row['records'],
+            'min_attendance': row['min_attendance'],
+            'max_attendance': row['max_attendance']
+        } for row in rows]
+
+    def iter_records(self, start: Optional[str] = None, end: Optional[str] = None,
+                     class_id: Optional[str] = None) -> Iterator[Dict]:
+        """Stream records in timestamp order without loading them all.
+
+        Uses its own connection, so a long export doesn't hold up writers.
+        """
+        with self._lock:
+            self._writer()
+        where, params = _range_clause(start, end, class_id)
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(RECORD_FIELDS)} FROM attendance_records{where} ORDER BY timestamp", params
+            )
+            while rows := cursor.fetchmany(EXPORT_FETCH_ROWS):
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+def iter_export(records: Iterator[Dict], export_format: str) -> Iterator[str]:
+    """Encode streamed records as CSV or NDJSON text chunks"""
+    if export_format == 'ndjson':
+        for record in records:
+            yield json.dumps(record) + "\n"
+        return
+    if export_format != 'csv':
+        raise ValueError("format must be 'csv' or 'ndjson'")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RECORD_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+attendance_store = AttendanceStore()
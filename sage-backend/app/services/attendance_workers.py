@@ -0,0 +1,75 @@
+# app/services/attendance_workers.py
+# Entry points for the batch attendance worker processes. Kept free of the
+# attendance service's imports (model manager, artifact janitor, SQLite
+# store) so a spawned worker only loads OpenCV and its own detector.
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from app.services.face_detection import DetectorPool
+from app.services.image_preprocessing import PreparedImage
+
+_detectors = None
+
+def init_batch_worker():
+    # One OpenCV thread and one detector per process; parallelism comes from the pool itself
+    cv2.setNumThreads(1)
+
+def _detector_pool() -> DetectorPool:
+    global _detectors
+    if _detectors is None:
+        _detectors = DetectorPool(size=1)
+    return _detectors
+
+def _detect_batched(frames: List[np.ndarray], batch_size: int) -> List[Tuple[int, List[Dict]]]:
+    pool = _detector_pool()
+    results = []
+    with pool.detector() as detector:
+        for start in range(0, len(frames), batch_size):
+            results.extend(detector.detect_batch(frames[start:start + batch_size]))
+    return results
+
+def detect_photos(photos: List[bytes], batch_size: int) -> Tuple[List[Optional[Tuple[int, List[Dict]]]], str]:
+    """Decode a group of photos and detect faces in batches (None = undecodable)"""
+    frames = []
+    positions = []
+    for position, image_data in enumerate(photos):
+        try:
+            frames.append(PreparedImage(image_data).bgr(max_width=1024))
+            positions.append(position)
+        except Exception:
+            pass
+    results = [None] * len(photos)
+    for position, result in zip(positions, _detect_batched(frames, batch_size)):
+        results[position] = result
+    return results, _detector_pool().method
+
+def detect_video(video_path: str, frame_indices: List[int], batch_size: int) -> Tuple[List[Tuple[int, int, List[Dict]]], str]:
+    """Decode one run of sampled video frames and detect faces.
+
+    Frames between samples are grabbed (demuxed and decoded) but never
+    converted or analysed. Returns (frame index, count, faces) per frame read.
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, frame_indices[0])
+        position = frame_indices[0]
+        frames = []
+        read_indices = []
+        for index in frame_indices:
+            while position < index:
+                if not capture.grab():
+                    break
+                position += 1
+            ok, frame = capture.read()
+            position += 1
+            if not ok:
+                break
+            if frame.shape[1] > 1024:
+                scale = 1024 / frame.shape[1]
+                frame = cv2.resize(frame, (1024, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            frames.append(frame)
+            read_indices.append(index)
+    finally:
+        capture.release()
+    detections = _detect_batched(frames, batch_size)
+    return [(index, count, faces) for index, (count, faces) in zip(read_indices, detections)], _detector_pool().method
@@ -0,0 +1,118 @@
+# app/services/audio_formats.py
+from fractions import Fraction
+
+try:
+    import av
+    AUDIO_ENCODING_AVAILABLE = True
+except ImportError:
+    AUDIO_ENCODING_AVAILABLE = False
+    print("PyAV not available - audio is served as WAV only")
+
+# format -> (media type, encoder, container, bit rate)
+AUDIO_FORMATS = {
+    'wav': ("audio/wav", None, None, None),
+    'ogg': ("audio/ogg", "libopus", "ogg", 32000),   # Opus in Ogg; speech is clear well below 32 kbps
+    'mp3': ("audio/mpeg", "libmp3lame", "mp3", 64000)
+}
+
+# Names and media types clients may ask for
+FORMAT_ALIASES = {
+    'wav': 'wav', 'wave': 'wav', 'audio/wav': 'wav', 'audio/wave': 'wav', 'audio/x-wav': 'wav',
+    'ogg': 'ogg', 'opus': 'ogg', 'audio/ogg': 'ogg', 'audio/opus': 'ogg',
+    'mp3': 'mp3', 'mpeg': 'mp3', 'audio/mpeg': 'mp3', 'audio/mp3': 'mp3'
+}
+
+# Smallest first; breaks ties between equally acceptable formats
+FORMAT_PREFERENCE = ('ogg', 'mp3', 'wav')
+
+# Opus only runs at these rates
+OPUS_RATES = (48000, 24000, 16000, 12000, 8000)
+
+def media_type(audio_format: str) -> str:
+    return AUDIO_FORMATS[audio_format][0]
+
+def negotiate_audio_format(requested: str | None = None, accept: str | None = None, fallback: str = 'wav') -> str:
+    """Pick an output format from an explicit request, else the Accept header.
+
+    Only formats this server can produce are chosen; wildcards and unknown
+    types fall back to `fallback`.
+    """
+    available = [name for name in AUDIO_FORMATS if name == 'wav' or AUDIO_ENCODING_AVAILABLE]
+    if requested:
+        audio_format = FORMAT_ALIASES.get(requested.strip().lower())
+        if audio_format in available:
+            return audio_format
+
+    best, best_q = None, 0.0
+    for entry in (accept or "").split(","):
+        media, _, params = entry.strip().partition(";")
+        audio_format = FORMAT_ALIASES.get(media.strip().lower())
+        if audio_format not in available:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q or (q == best_q and best is not None
+                           and FORMAT_PREFERENCE.index(audio_format) < FORMAT_PREFERENCE.index(best)):
+            best, best_q = audio_format, q
+    return best or fallback
+
+def encode_audio(source_path: str, output_path: str, audio_format: str) -> bool:
+    """Re-encode an audio file (e.g. synthesized WAV) to a compressed format.
+
+    Blocking; run it in an executor.
+    """
+    _, codec, container_format, bit_rate = AUDIO_FORMATS[audio_format]
+    if codec is None or not AUDIO_ENCODING_AVAILABLE:
+        return False
+
+    try:
+        with av.open(source_path) as source, av.open(output_path, "w", format=container_format) as output:
+            in_stream = source.streams.audio[0]
+            rate = in_stream.rate
+            if codec == "libopus" and rate not in OPUS_RATES:
+                rate = min(OPUS_RATES, key=lambda candidate: (candidate < rate, abs(candidate - rate)))
+            out_stream = output.add_stream(codec, rate=rate, layout="mono")
+            out_stream.codec_context.bit_rate = bit_rate
+
+            encoder = out_stream.codec_context
+            resampler = av.AudioResampler(format=encoder.format.name, layout="mono", rate=rate)
+            # Encoders take fixed-size frames; the fifo re-blocks the decoded audio
+            fifo = av.AudioFifo()
+            frame_size = encoder.frame_size or 1024
+            written = 0
+
+            def encode_available(final: bool = False):
+                nonlocal written
+                while True:
+                    frame = fifo.read(frame_size)
+                    if frame is None and final and fifo.samples:
+                        frame = fifo.read()
+                    if frame is None:
+                        return
+                    frame.pts = written
+                    frame.time_base = Fraction(1, rate)
+                    written += frame.samples
+                    for packet in out_stream.encode(frame):
+                        output.mux(packet)
+
+            for frame in source.decode(in_stream):
+                for resampled in resampler.resample(frame):
+                    resampled.pts = None
+                    fifo.write(resampled)
+                encode_available()
+            for resampled in resampler.resample(None):
+                resampled.pts = None
+                fifo.write(resampled)
+            encode_available(final=True)
+            for packet in out_stream.encode(None):
+                output.mux(packet)
+        return True
+    except Exception as e:
+        print(f"Audio encoding to {audio_format} failed: {e}")
+        return False
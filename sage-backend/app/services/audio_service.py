@@ -1,80 +1,639 @@
 # app/services/audio_service.py
+import asyncio
+import hashlib
+import io
 import os
+import queue
 import tempfile
-import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+import numpy as np
+
+from app.core.model_manager import model_manager
 
 #File transcription using faster whisper
-from faster_whisper import WhisperModel
-model_whisper = WhisperModel("base", device="cpu", compute_type="int8")
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 
-async def transcribe_audio(file) -> str:
-    """Accept a full audio file, save to temp, and transcribe using Faster-Whisper."""
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-        contents = await file.read()
-        tmp.write(contents)
-        tmp_path = tmp.name
+# PyAV (already a faster-whisper dependency) decodes audio in memory
+import av
+
+# Whisper settings
+WHISPER_SETTINGS = {
+    'model_size': 'base',
+    'device': 'cpu',
+    'compute_type': 'int8',
+    'cpu_threads': 0,       # 0 = CTranslate2 default
+    'batch_size': 8,        # Utterances (or VAD chunks) decoded per forward pass
+    'max_wait_ms': 30,      # How long a request waits for companions
+    'workers': 1            # Batching worker threads
+}
+
+def _load_whisper():
+    model = WhisperModel(
+        WHISPER_SETTINGS['model_size'],
+        device=WHISPER_SETTINGS['device'],
+        compute_type=WHISPER_SETTINGS['compute_type'],
+        cpu_threads=WHISPER_SETTINGS['cpu_threads'],
+        num_workers=WHISPER_SETTINGS['workers']
+    )
+    # Built once per load; the plain model stays reachable as pipeline.model
+    return BatchedInferencePipeline(model=model)
+
+# Whisper (wrapped in its batched pipeline) loads on first use and unloads when idle
+whisper_handle = model_manager.register("whisper", _load_whisper)
+
+# Worker pool for audio decoding, keeping it off the event loop
+executor = ThreadPoolExecutor(max_workers=2)
+
+SAMPLE_RATE = 16000
+# Whisper's window; longer utterances can't share a batched pass with others
+MAX_BATCHED_SECONDS = 30
+
+# Streaming transcription settings
+STREAM_SETTINGS = {
+    'partial_interval_s': 1.0,   # New audio needed before re-decoding a partial
+    'vad_frame_ms': 30,          # Energy VAD frame size
+    'vad_threshold': 0.01,       # RMS above which a frame counts as speech
+    'silence_ms': 600,           # Trailing silence that closes a segment
+    'speech_pad_ms': 200,        # Silence kept before speech when dropping a quiet lead-in
+    'max_segment_s': 15.0        # Force a segment boundary after this long
+}
+
+# Lecture recording settings
+LECTURE_SETTINGS = {
+    'segment_s': 30.0,        # Target segment length (Whisper's window)
+    'cut_search_s': 5.0,      # Look back this far for a quiet point to cut at
+    'max_in_flight': 4,       # Segments queued for Whisper before decoding pauses
+    'write_block': 1 << 20    # Disk write buffer for streamed uploads
+}
+
+# Long-running lecture decode loops get their own threads
+lecture_executor = ThreadPoolExecutor(max_workers=2)
+
+class TranscriptionService:
+    """Off-loop Whisper transcription that batches queued utterances.
+
+    Worker threads pull pending utterances, wait up to `max_wait_ms` for
+    more, and transcribe them together with faster-whisper's batched
+    pipeline: short utterances are concatenated and each one becomes a clip
+    in a single batched pass. Callers get a Future, so both async handlers
+    and sync worker threads can use it.
+    """
+
+    def __init__(self):
+        self.pending = queue.Queue()
+        self.workers = []
+        self.batches = 0
+        self.utterances = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        with self._lock:
+            while len(self.workers) < WHISPER_SETTINGS['workers']:
+                worker = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, audio: np.ndarray) -> Future:
+        self._ensure_workers()
+        future = Future()
+        self.pending.put((audio, future))
+        return future
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        return await asyncio.wrap_future(self.submit(audio))
+
+    def _collect(self) -> list:
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + WHISPER_SETTINGS['max_wait_ms'] / 1000
+        while len(batch) < WHISPER_SETTINGS['batch_size']:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests cancelled while queued (e.g. a superseded partial)
+            batch = [(audio, future) for audio, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                with whisper_handle.use() as pipeline:
+                    texts = _transcribe_batch(pipeline, [audio for audio, _ in batch])
+                for (_, future), text in zip(batch, texts):
+                    future.set_result(text)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._lock:
+                self.batches += 1
+                self.utterances += len(batch)
+                self.audio_seconds += sum(len(audio) for audio, _ in batch) / SAMPLE_RATE
+                self.busy_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "model_size": WHISPER_SETTINGS['model_size'],
+            "compute_type": WHISPER_SETTINGS['compute_type'],
+            "queue_depth": self.pending.qsize(),
+            "batches": self.batches,
+            "utterances": self.utterances,
+            "average_batch_size": round(self.utterances / self.batches, 2) if self.batches else 0.0,
+            # Processing time per second of audio; below 1.0 is faster than real time
+            "real_time_factor": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None
+        }
+
+def _transcribe_batch(pipeline, audios: list[np.ndarray]) -> list[str]:
+    """Transcribe several utterances, sharing batched forward passes where possible"""
+    texts = [""] * len(audios)
+
+    # Long recordings: the pipeline batches their own VAD chunks
+    short = []
+    for i, audio in enumerate(audios):
+        if audio.size == 0:
+            continue
+        if len(audio) > MAX_BATCHED_SECONDS * SAMPLE_RATE:
+            segments, info = pipeline.transcribe(audio, language="en", batch_size=WHISPER_SETTINGS['batch_size'])
+            texts[i] = " ".join([seg.text for seg in segments]).strip()
+        else:
+            short.append(i)
+
+    if len(short) == 1:
+        segments, info = pipeline.model.transcribe(audios[short[0]], language="en")
+        texts[short[0]] = " ".join([seg.text for seg in segments]).strip()
+    elif short:
+        # One clip per utterance over the concatenated audio (bounds in seconds)
+        clips = []
+        offset = 0
+        for i in short:
+            clips.append({"start": offset / SAMPLE_RATE, "end": (offset + len(audios[i])) / SAMPLE_RATE})
+            offset += len(audios[i])
+        combined = np.concatenate([audios[i] for i in short])
+        segments, info = pipeline.transcribe(
+            combined,
+            language="en",
+            vad_filter=False,
+            clip_timestamps=clips,
+            batch_size=WHISPER_SETTINGS['batch_size'],
+            without_timestamps=True
+        )
+        # Without timestamps each clip decodes to exactly one segment, in clip order
+        for i, seg in zip(short, segments):
+            texts[i] = seg.text.strip()
+
+    return texts
 
-    # Force English language
-    segments, info = model_whisper.transcribe(tmp_path, language="en")
-    transcript = " ".join([seg.text for seg in segments])
+transcription_service = TranscriptionService()
 
-    os.remove(tmp_path)
-    return transcript
+def get_transcription_status() -> dict:
+    return {
+        "model": whisper_handle.status(),
+        "transcription": transcription_service.stats()
+    }
+
+async def transcribe_audio(file) -> str:
+    """Accept a full audio file and transcribe it in memory using Faster-Whisper."""
+    contents = await file.read()
+    return await transcribe_audio_chunk(contents)
 
 # Chunked Transcription
 async def transcribe_audio_chunk(data: bytes) -> str:
     """Perform transcription for a chunk of audio data."""
     try:
-        # Save the raw audio data to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_input:
-            tmp_input.write(data)
-            input_path = tmp_input.name
-
-        # Convert to WAV using ffmpeg
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_output:
-            output_path = tmp_output.name
-
-        # Use ffmpeg to convert WebM to WAV
-        ffmpeg_path = r"D:\ffmpeg-master-latest-win64-gpl-shared\bin\ffmpeg.exe"  # Your path
-        
-        cmd = [
-            ffmpeg_path, '-y', '-i', input_path,
-            '-ar', '16000',  # Sample rate
-            '-ac', '1',      # Mono
-            '-c:a', 'pcm_s16le',  # PCM format
-            output_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print(f"FFmpeg error: {result.stderr}")
+        loop = asyncio.get_event_loop()
+        audio = await loop.run_in_executor(executor, decode_audio, data)
+        if audio.size == 0:
+            print("No valid audio decoded")
             return ""
+        return await transcription_service.transcribe(audio)
+    except Exception as e:
+        print(f"Transcription error: {e}")
+        return ""
 
-        # Check if the output file was created and has content
-        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-            print("No valid audio output from ffmpeg")
-            return ""
+def decode_audio(data: bytes) -> np.ndarray:
+    """Decode compressed audio (WebM/Opus, MP3, WAV, ...) in memory to 16 kHz mono float32"""
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    chunks = []
+    try:
+        with av.open(io.BytesIO(data), mode="r") as container:
+            for frame in container.decode(audio=0):
+                for resampled in resampler.resample(frame):
+                    chunks.append(resampled.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        # A truncated trailing cluster is expected mid-stream; keep whatever decoded
+        if not chunks:
+            print(f"Audio decode error: {e}")
+    for resampled in resampler.resample(None):
+        chunks.append(resampled.to_ndarray().reshape(-1))
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks)
+
+async def _transcribe_pcm(audio: np.ndarray) -> str:
+    """Await a transcription without holding a thread; shares batches with other callers"""
+    if audio.size == 0:
+        return ""
+    return await transcription_service.transcribe(audio)
+
+def _speech_frames(audio: np.ndarray) -> np.ndarray:
+    """Energy VAD: boolean speech flag per frame"""
+    frame = int(SAMPLE_RATE * STREAM_SETTINGS['vad_frame_ms'] / 1000)
+    count = len(audio) // frame
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = audio[:count * frame].reshape(count, frame)
+    return np.sqrt((frames ** 2).mean(axis=1)) > STREAM_SETTINGS['vad_threshold']
+
+def find_segment_boundary(audio: np.ndarray) -> int | None:
+    """Sample offset where a segment closes: speech followed by enough silence"""
+    frame = int(SAMPLE_RATE * STREAM_SETTINGS['vad_frame_ms'] / 1000)
+    speech = _speech_frames(audio)
+    if not speech.any():
+        return None
+
+    silence_frames = STREAM_SETTINGS['silence_ms'] // STREAM_SETTINGS['vad_frame_ms']
+    run = 0
+    seen_speech = False
+    for i, is_speech in enumerate(speech):
+        if is_speech:
+            seen_speech = True
+            run = 0
+        elif seen_speech:
+            run += 1
+            if run >= silence_frames:
+                # Cut in the middle of the silence
+                return (i - run // 2) * frame
+
+    if len(audio) >= STREAM_SETTINGS['max_segment_s'] * SAMPLE_RATE:
+        return len(audio)
+    return None
+
+def leading_silence(audio: np.ndarray) -> int:
+    """Samples of silence before the first speech that can be dropped, keeping a short pad"""
+    frame = int(SAMPLE_RATE * STREAM_SETTINGS['vad_frame_ms'] / 1000)
+    speech = _speech_frames(audio)
+    first = int(speech.argmax()) if speech.any() else len(speech)
+    pad = int(SAMPLE_RATE * STREAM_SETTINGS['speech_pad_ms'] / 1000)
+    return max(0, first * frame - pad)
+
+class ByteStream(io.RawIOBase):
+    """In-memory pipe: reads block until more bytes are written or the writer closes"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0          # read position within the first chunk
+        self._closed_for_writing = False
+        self._cond = threading.Condition()
+
+    def readable(self) -> bool:
+        return True
+
+    def write_chunk(self, chunk: bytes):
+        with self._cond:
+            self._chunks.append(bytes(chunk))
+            self._cond.notify_all()
+
+    def close_writer(self):
+        with self._cond:
+            self._closed_for_writing = True
+            self._cond.notify_all()
+
+    def readinto(self, buffer) -> int:
+        with self._cond:
+            while not self._chunks and not self._closed_for_writing:
+                self._cond.wait()
+            if not self._chunks:
+                return 0
+            chunk = self._chunks[0]
+            size = min(len(buffer), len(chunk) - self._offset)
+            buffer[:size] = chunk[self._offset:self._offset + size]
+            self._offset += size
+            if self._offset == len(chunk):
+                self._chunks.pop(0)
+                self._offset = 0
+            return size
+
+class StreamingTranscriber:
+    """Incrementally transcribes a growing recording.
+
+    A decoder thread demuxes the byte stream once, as it arrives, so each
+    step only sees the audio added since the last one. Closed segments
+    (found by VAD) are transcribed once and become final, while the open
+    tail is re-transcribed as a partial. Leading silence is dropped, so a
+    quiet start neither delays nor force-cuts the first utterance. When the
+    stream ends only the tail is left to transcribe.
+
+    step() and finish() run on the event loop and await the Whisper batcher,
+    so any number of streams can wait on transcriptions without tying up
+    worker threads.
+    """
+
+    def __init__(self):
+        self.stream = ByteStream()
+        self.window = np.zeros(0, dtype=np.float32)   # decoded audio not yet covered by final segments
+        self.finals = []
+        self.decoded = 0           # samples decoded so far
+        self.last_step = 0         # samples decoded at the last partial
+        self._new_pcm = []
+        self._pcm_lock = threading.Lock()
+        self._decoder = None
+        self._drained = Future()   # set by the decoder thread once the stream is fully decoded
+        self._lock = asyncio.Lock()
+
+    def add(self, chunk: bytes):
+        self.stream.write_chunk(chunk)
+        if self._decoder is None:
+            self._decoder = threading.Thread(target=self._decode_loop, name="stream-decoder", daemon=True)
+            self._decoder.start()
+
+    def _decode_loop(self):
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+
+        def keep(frames):
+            for resampled in frames:
+                pcm = resampled.to_ndarray().reshape(-1)
+                with self._pcm_lock:
+                    self._new_pcm.append(pcm)
+                    self.decoded += len(pcm)
 
-        # Use Faster-Whisper for transcription with FORCED ENGLISH
-        segments, info = model_whisper.transcribe(output_path, language="en")
-        transcript = " ".join([seg.text for seg in segments])
-        
-        # Clean up temp files
         try:
-            os.remove(input_path)
-            os.remove(output_path)
-        except:
+            with av.open(self.stream, mode="r") as container:
+                for frame in container.decode(audio=0):
+                    keep(resampler.resample(frame))
+        except av.error.FFmpegError as e:
+            # A truncated trailing cluster is expected when the client stops mid-stream
+            if not self.decoded:
+                print(f"Audio decode error: {e}")
+        except Exception as e:
+            print(f"Audio decode error: {e}")
+        finally:
+            keep(resampler.resample(None))
+            self._drained.set_result(None)
+
+    def _take_new_audio(self):
+        with self._pcm_lock:
+            new, self._new_pcm = self._new_pcm, []
+        if new:
+            self.window = np.concatenate([self.window, *new])
+
+    def _drop_leading_silence(self):
+        silence = leading_silence(self.window)
+        if silence:
+            self.window = self.window[silence:]
+
+    async def step(self) -> list[dict]:
+        """Take newly decoded audio and return partial/final transcript messages"""
+        async with self._lock:
+            if self.decoded - self.last_step < STREAM_SETTINGS['partial_interval_s'] * SAMPLE_RATE:
+                return []
+            self._take_new_audio()
+            self.last_step = self.decoded
+
+            messages = []
+            self._drop_leading_silence()
+            boundary = find_segment_boundary(self.window)
+            while boundary is not None:
+                text = await _transcribe_pcm(self.window[:boundary])
+                self.window = self.window[boundary:]
+                if text:
+                    self.finals.append(text)
+                    messages.append({"type": "final_segment", "text": text, "transcript": self.transcript()})
+                self._drop_leading_silence()
+                boundary = find_segment_boundary(self.window)
+
+            if _speech_frames(self.window).any():
+                partial = await _transcribe_pcm(self.window)
+                if partial:
+                    messages.append({"type": "partial_transcript", "text": partial, "transcript": self.transcript(partial)})
+            return messages
+
+    async def finish(self) -> str:
+        """Close the last segment and return the full transcript"""
+        self.close()
+        if self._decoder is not None:
+            await asyncio.wrap_future(self._drained)
+        async with self._lock:
+            self._take_new_audio()
+            self._drop_leading_silence()
+            tail = await _transcribe_pcm(self.window) if _speech_frames(self.window).any() else ""
+            self.window = np.zeros(0, dtype=np.float32)
+            if tail:
+                self.finals.append(tail)
+            return self.transcript()
+
+    def close(self):
+        """End the byte stream; the decoder thread drains what is left and exits"""
+        self.stream.close_writer()
+
+    def transcript(self, partial: str = "") -> str:
+        return " ".join(self.finals + ([partial] if partial else [])).strip()
+
+class GrowingFile(io.RawIOBase):
+    """Read side of a file that is still being written.
+
+    Reads block until the writer has appended more data or finished, so a
+    decoder can consume an upload while it is still arriving.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader = open(path, "rb")
+        self._written = 0
+        self._finished = False
+        self._cond = threading.Condition()
+
+    def readable(self) -> bool:
+        return True
+
+    def notify_written(self, size: int):
+        with self._cond:
+            self._written += size
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def readinto(self, buffer) -> int:
+        with self._cond:
+            while self._reader.tell() >= self._written and not self._finished:
+                self._cond.wait()
+        return self._reader.readinto(buffer)
+
+    def wait_for(self, size: int | None = None) -> int:
+        """Block until `size` bytes are written (None: the whole file); returns bytes available"""
+        with self._cond:
+            while not self._finished and (size is None or self._written < size):
+                self._cond.wait()
+            return self._written
+
+    def close(self):
+        self._reader.close()
+        super().close()
+
+class LectureUpload:
+    """Streams an upload to a temp file in bounded memory while it is read back"""
+
+    def __init__(self, suffix: str = ""):
+        fd, self.path = tempfile.mkstemp(suffix=suffix)
+        self._writer = os.fdopen(fd, "wb", buffering=LECTURE_SETTINGS['write_block'])
+        self.reader = GrowingFile(self.path)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._writer.write(chunk)
+        self._writer.flush()
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self.reader.notify_written(len(chunk))
+
+    def finish(self):
+        self._writer.close()
+        self.reader.finish()
+
+    def cleanup(self):
+        if not self._writer.closed:
+            self.finish()
+        self.reader.close()
+        try:
+            os.remove(self.path)
+        except OSError:
             pass
-        
-        return transcript.strip()
-        
-    except FileNotFoundError:
-        print("FFmpeg not found. Please install FFmpeg to process audio.")
-        return ""
-    except Exception as e:
-        print(f"Transcription error: {e}")
-        return ""
+
+def _quiet_cut(audio: np.ndarray, target: int) -> int:
+    """Pick the quietest frame in the search window before `target` as the cut point"""
+    frame = int(SAMPLE_RATE * STREAM_SETTINGS['vad_frame_ms'] / 1000)
+    start = max(0, target - int(LECTURE_SETTINGS['cut_search_s'] * SAMPLE_RATE))
+    window = audio[start:target]
+    count = len(window) // frame
+    if count == 0:
+        return target
+    energy = (window[:count * frame].reshape(count, frame) ** 2).mean(axis=1)
+    return start + int(energy.argmin()) * frame + frame // 2
+
+# Top-level MP4 boxes that may precede the movie header in a fast-start file
+_MP4_HEADER_BOXES = {b"ftyp", b"free", b"skip", b"wide", b"pdin", b"uuid"}
+
+def is_progressive(source: GrowingFile) -> bool:
+    """Whether a recording can be decoded before it has fully arrived.
+
+    WebM/Matroska, Ogg, MP3, WAV and FLAC can. MP4-family files (m4a, mp4,
+    mov) only can when "fast-start", with the moov box before the media
+    data; recorders usually write it at the end.
+    """
+    if source.wait_for(8) < 8:
+        return True
+    with open(source.path, "rb") as f:
+        if f.read(8)[4:8] != b"ftyp":
+            return True
+        position = 0
+        while True:
+            available = source.wait_for(position + 16)
+            if available < position + 8:
+                return True
+            f.seek(position)
+            header = f.read(16)
+            size, box = int.from_bytes(header[:4], "big"), header[4:8]
+            if box == b"moov":
+                return True
+            if box not in _MP4_HEADER_BOXES:
+                return False
+            if size == 1:
+                size = int.from_bytes(header[8:16], "big")
+            if size < 8:
+                return False
+            position += size
+
+def transcribe_lecture_stream(source, emit) -> int:
+    """Decode a (possibly still uploading) recording and transcribe it segment by segment.
+
+    Non-progressive uploads (MP4 with the moov box at the end) are decoded
+    once the upload completes, from the seekable temp file.
+
+    Segments are cut near `segment_s` at quiet points and submitted to the
+    batched transcription service without waiting for earlier ones, so
+    decoding continues while Whisper works. `emit(segment)` is called in
+    order with {"index", "start", "end", "text"} as transcripts complete.
+    Returns the number of segments.
+    """
+    segment_samples = int(LECTURE_SETTINGS['segment_s'] * SAMPLE_RATE)
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    pending = []
+    pending_samples = 0
+    offset = 0
+    submitted = []
+    emitted = 0
+
+    def submit(audio: np.ndarray):
+        nonlocal offset
+        segment = {
+            "index": len(submitted),
+            "start": round(offset / SAMPLE_RATE, 2),
+            "end": round((offset + len(audio)) / SAMPLE_RATE, 2)
+        }
+        offset += len(audio)
+        submitted.append((segment, transcription_service.submit(audio)))
+        # Bound queued audio: wait on the oldest transcript when too many are in flight
+        while len(submitted) - emitted > LECTURE_SETTINGS['max_in_flight']:
+            submitted[emitted][1].exception()
+            emit_ready()
+        emit_ready()
+
+    def emit_ready(block: bool = False):
+        """Emit finished transcripts in order"""
+        nonlocal emitted
+        while emitted < len(submitted):
+            segment, future = submitted[emitted]
+            if not block and not future.done():
+                break
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"Lecture segment {segment['index']} failed: {e}")
+                text = ""
+            emit({**segment, "text": text})
+            emitted += 1
+
+    def drain(resampled_frames):
+        nonlocal pending, pending_samples
+        for resampled in resampled_frames:
+            samples = resampled.to_ndarray().reshape(-1)
+            pending.append(samples)
+            pending_samples += len(samples)
+        if pending_samples >= segment_samples:
+            audio = np.concatenate(pending)
+            while len(audio) >= segment_samples:
+                cut = _quiet_cut(audio, segment_samples)
+                submit(audio[:cut])
+                audio = audio[cut:]
+            pending = [audio]
+            pending_samples = len(audio)
+
+    if isinstance(source, GrowingFile) and not is_progressive(source):
+        source.wait_for()
+        source = source.path
+
+    with av.open(source, mode="r") as container:
+        for frame in container.decode(audio=0):
+            drain(resampler.resample(frame))
+    drain(resampler.resample(None))
+    if pending_samples:
+        submit(np.concatenate(pending))
+
+    emit_ready(block=True)
+    return len(submitted)
 
 # Alias for compatibility with audio.py
 transcribe_chunk = transcribe_audio_chunk
@@ -0,0 +1,154 @@
+# app/services/disk_cache.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+class DiskLRUCache:
+    """Content-addressed files in one directory with LRU eviction by size and idle age.
+
+    The LRU order lives in memory (rebuilt from file mtimes on first use),
+    so lookups and evictions never scan the directory. Subclasses map keys
+    to file names and read or write the payloads; files matching
+    `pattern` (whose first group is the key) are picked up on the scan.
+    """
+
+    # Leftovers of interrupted writes, removed on the startup scan
+    STRAY_SECONDS = 3600
+
+    def __init__(self, directory: str, max_bytes: int, pattern: str, max_idle_seconds: float | None = None,
+                 stray_prefix: str | None = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self.pattern = re.compile(pattern)
+        self.stray_prefix = stray_prefix
+        self.entries = OrderedDict()  # key -> (size, last used), least recent first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def filename(self, key: str) -> str:
+        return key
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, self.filename(key))
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            match = self.pattern.match(entry.name)
+            if match:
+                stat = entry.stat()
+                found.append((stat.st_mtime, match.group(1), stat.st_size))
+            elif (self.stray_prefix and entry.name.startswith(self.stray_prefix)
+                  and now - entry.stat().st_mtime > self.STRAY_SECONDS):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        for used, key, size in sorted(found):
+            self.entries[key] = (size, used)
+            self.total_bytes += size
+        self._loaded = True
+
+    def lookup(self, key: str) -> bool:
+        """Whether `key` is cached, counting the lookup and marking it recently used"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key not in self.entries:
+                self.misses += 1
+                return False
+            try:
+                os.utime(self.path(key))  # keep mtime as the LRU order across restarts
+            except OSError:
+                self.total_bytes -= self.entries.pop(key)[0]
+                self.misses += 1
+                return False
+            size = self.entries.pop(key)[0]
+            self.entries[key] = (size, time.time())
+            self.hits += 1
+            self.bytes_saved += size
+            return True
+
+    def discard(self, key: str):
+        """Forget an entry whose file turned out to be unreadable"""
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[0]
+
+    def add(self, key: str, size: int) -> bool:
+        """Record a file just written at path(key) and evict past the size quota.
+
+        A file larger than the whole quota is not recorded and False is
+        returned; it stays with the caller (the next startup scan evicts it).
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self.total_bytes -= self.entries.pop(key, (0, 0))[0]
+            if size > self.max_bytes:
+                return False
+            self.entries[key] = (size, time.time())
+            self.total_bytes += size
+            self._evict()
+            return True
+
+    def write(self, key: str, data: bytes):
+        """Atomically write a payload for `key` and record it (skipped past the quota)"""
+        if len(data) > self.max_bytes:
+            return
+        path = self.path(key)
+        os.makedirs(self.directory, exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+        self.add(key, len(data))
+
+    def _evict(self, cutoff: float = 0.0) -> int:
+        evicted = 0
+        while self.entries:
+            old_key, (size, used) = next(iter(self.entries.items()))
+            if self.total_bytes <= self.max_bytes and used >= cutoff:
+                break
+            self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(old_key))
+            except OSError:
+                pass
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    def enforce(self) -> int:
+        """Evict past the size quota and entries idle longer than max_idle_seconds"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            cutoff = time.time() - self.max_idle_seconds if self.max_idle_seconds else 0.0
+            return self._evict(cutoff=cutoff)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_idle_seconds": self.max_idle_seconds,
+            "evicted": self.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved
+        }
@@ -0,0 +1,192 @@
+# app/services/face_detection.py
+import os
+import queue
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import cv2
+import numpy as np
+
+try:
+    import openvino as ov
+    OPENVINO_AVAILABLE = True
+except ImportError:
+    OPENVINO_AVAILABLE = False
+
+FACE_DETECTOR_SETTINGS = {
+    # 'openvino' uses an OpenVINO IR face model when present, else OpenCV's DNN
+    'backend': 'openvino',
+    # Open Model Zoo model with the same SSD output layout as OpenCV's detector:
+    #   omz_downloader --name face-detection-retail-0004 --precisions FP16-INT8 -o models
+    'openvino_model': os.path.join("models", "intel", "face-detection-retail-0004", "FP16-INT8",
+                                   "face-detection-retail-0004.xml"),
+    'openvino_device': "CPU",
+    'infer_requests': 4,        # Parallel infer requests per detector for batches
+    'pool_size': 2,             # Detector instances, one per attendance executor thread
+    'confidence': 0.5
+}
+
+def _faces_from_ssd(detections: np.ndarray, sizes: List[Tuple[int, int]], batch_index: int | None = None,
+                    confidence_threshold: float = 0.5) -> List[List[Dict]]:
+    """Parse [1, 1, N, 7] SSD output rows (image id, label, confidence, x1, y1, x2, y2).
+
+    With `batch_index` every row belongs to that image (one request per image);
+    otherwise column 0 says which image of the batch a row belongs to.
+    """
+    results = [[] for _ in sizes]
+    for row in detections.reshape(-1, 7):
+        image_id = int(row[0])
+        # A negative image id terminates the list in OpenVINO models
+        if image_id < 0:
+            break
+        confidence = row[2]
+        if confidence <= confidence_threshold:
+            continue
+        index = batch_index if batch_index is not None else image_id
+        h, w = sizes[index]
+        x1, y1 = int(row[3] * w), int(row[4] * h)
+        x2, y2 = int(row[5] * w), int(row[6] * h)
+        results[index].append({
+            'bbox': [x1, y1, x2 - x1, y2 - y1],
+            'confidence': float(confidence)
+        })
+    return results
+
+class FaceDetector:
+    """One detector instance; never used by two threads at once.
+
+    Always has the Haar cascade as a fallback, plus either an OpenCV DNN net
+    or a compiled OpenVINO model with its own async infer-request queue.
+    """
+
+    def __init__(self, backend: str = 'opencv', compiled_model=None):
+        self.confidence = FACE_DETECTOR_SETTINGS['confidence']
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.net = None
+        self.infer_queue = None
+        self.method = 'Haar Cascade'
+
+        if backend == 'openvino' and compiled_model is not None:
+            self.infer_queue = ov.AsyncInferQueue(compiled_model, FACE_DETECTOR_SETTINGS['infer_requests'])
+            self.infer_queue.set_callback(self._collect)
+            self._outputs = {}
+            self.method = 'OpenVINO'
+        elif backend in ('opencv', 'openvino'):
+            try:
+                self.net = cv2.dnn.readNetFromTensorflow(
+                    cv2.samples.findFile("opencv_face_detector_uint8.pb"),
+                    cv2.samples.findFile("opencv_face_detector.pbtxt")
+                )
+                self.method = 'DNN'
+            except Exception:
+                self.net = None
+
+    @property
+    def use_dnn(self) -> bool:
+        return self.method != 'Haar Cascade'
+
+    def detect_haar(self, image: np.ndarray) -> Tuple[int, List[Dict]]:
+        """Detect faces using Haar Cascade (basic but reliable)"""
+        try:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            faces = self.face_cascade.detectMultiScale(
+                gray,
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(30, 30),
+                flags=cv2.CASCADE_SCALE_IMAGE
+            )
+            face_list = [{
+                'bbox': [int(x), int(y), int(w), int(h)],
+                'confidence': 0.8  # Haar cascade doesn't provide confidence
+            } for (x, y, w, h) in faces]
+            return len(face_list), face_list
+        except Exception as e:
+            print(f"Haar face detection error: {e}")
+            return 0, []
+
+    def _detect_opencv(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        # One 4-D blob, one forward pass for the whole batch
+        blob = cv2.dnn.blobFromImages(images, 1.0, (300, 300), [104, 117, 123])
+        self.net.setInput(blob)
+        detections = self.net.forward()
+        return _faces_from_ssd(detections, [image.shape[:2] for image in images],
+                               confidence_threshold=self.confidence)
+
+    def _collect(self, request, index):
+        self._outputs[index] = request.get_output_tensor(0).data.copy()
+
+    def _detect_openvino(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        # The IR takes raw BGR 300x300 (no mean subtraction); one request per image
+        self._outputs = {}
+        for index, image in enumerate(images):
+            blob = cv2.dnn.blobFromImage(image, 1.0, (300, 300))
+            self.infer_queue.start_async({0: blob}, index)
+        self.infer_queue.wait_all()
+        sizes = [image.shape[:2] for image in images]
+        results = []
+        for index in range(len(images)):
+            results.append(_faces_from_ssd(self._outputs[index], sizes, batch_index=index,
+                                           confidence_threshold=self.confidence)[index])
+        return results
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[Tuple[int, List[Dict]]]:
+        if not images:
+            return []
+        try:
+            if self.infer_queue is not None:
+                faces = self._detect_openvino(images)
+            elif self.net is not None:
+                faces = self._detect_opencv(images)
+            else:
+                return [self.detect_haar(image) for image in images]
+            return [(len(image_faces), image_faces) for image_faces in faces]
+        except Exception as e:
+            print(f"{self.method} face detection error: {e}")
+            # Fallback to Haar cascade
+            return [self.detect_haar(image) for image in images]
+
+    def detect(self, image: np.ndarray) -> Tuple[int, List[Dict]]:
+        return self.detect_batch([image])[0]
+
+def _compile_openvino_model():
+    model_path = FACE_DETECTOR_SETTINGS['openvino_model']
+    if not OPENVINO_AVAILABLE or not os.path.exists(model_path):
+        return None
+    try:
+        core = ov.Core()
+        return core.compile_model(model_path, FACE_DETECTOR_SETTINGS['openvino_device'],
+                                  {"PERFORMANCE_HINT": "THROUGHPUT"})
+    except Exception as e:
+        print(f"OpenVINO face model failed to load, using OpenCV DNN: {e}")
+        return None
+
+class DetectorPool:
+    """Fixed set of FaceDetector instances handed out one caller at a time.
+
+    cv2.dnn nets and OpenVINO infer requests are not safe to share between
+    threads, so every concurrent caller gets its own detector; an OpenVINO
+    compiled model (which is thread-safe) is shared by all of them.
+    """
+
+    def __init__(self, size: int | None = None, backend: str | None = None):
+        size = size or FACE_DETECTOR_SETTINGS['pool_size']
+        backend = backend or FACE_DETECTOR_SETTINGS['backend']
+        compiled_model = _compile_openvino_model() if backend == 'openvino' else None
+        self.detectors = [FaceDetector(backend, compiled_model) for _ in range(size)]
+        self.method = self.detectors[0].method
+        self._idle = queue.Queue()
+        for detector in self.detectors:
+            self._idle.put(detector)
+        print(f"Face detection: {self.method} x{size}")
+
+    @property
+    def use_dnn(self) -> bool:
+        return self.method != 'Haar Cascade'
+
+    @contextmanager
+    def detector(self):
+        detector = self._idle.get()
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
@@ -0,0 +1,101 @@
+# app/services/face_tracking.py
+import numpy as np
+from typing import Dict, List
+
+class _Track:
+    __slots__ = ("id", "bbox", "anchor", "velocity", "hits", "missed")
+
+    def __init__(self, track_id: int, bbox: np.ndarray):
+        self.id = track_id
+        self.bbox = bbox                 # current (predicted) x, y, w, h
+        self.anchor = bbox.copy()        # bbox at the last matching detection
+        self.velocity = np.zeros(4)      # change per frame
+        self.hits = 1
+        self.missed = 0
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of two sets of x, y, w, h boxes"""
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+class IoUTracker:
+    """Keeps face identities between sparse detections.
+
+    Detections are matched to tracks greedily by IoU; between detections
+    tracks move at their last observed velocity, so no frame has to be
+    decoded just to keep boxes current. A track counts towards the
+    headcount after `min_hits` detections and is dropped after `max_missed`
+    detections without a match, which keeps the count from flickering when
+    one detection pass misses a face.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, min_hits: int = 2, max_missed: int = 3):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_missed = max_missed
+        self.tracks: List[_Track] = []
+        self.frame = 0
+        self.last_update_frame = 0
+        self._next_id = 1
+
+    def predict(self, frames: int = 1):
+        """Advance all tracks by `frames` without a detection"""
+        self.frame += frames
+        for track in self.tracks:
+            track.bbox = track.bbox + track.velocity * frames
+
+    def update(self, detections: List[List[int]]):
+        """Fold in a detection pass made on the current frame"""
+        elapsed = max(1, self.frame - self.last_update_frame)
+        self.last_update_frame = self.frame
+        boxes = np.asarray(detections, dtype=float).reshape(-1, 4)
+
+        matched_tracks, matched_boxes = set(), set()
+        if self.tracks and len(boxes):
+            ious = iou_matrix(np.stack([track.bbox for track in self.tracks]), boxes)
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_boxes:
+                    continue
+                matched_tracks.add(t)
+                matched_boxes.add(d)
+                track = self.tracks[t]
+                track.velocity = (boxes[d] - track.anchor) / elapsed
+                track.bbox = boxes[d].copy()
+                track.anchor = boxes[d].copy()
+                track.hits += 1
+                track.missed = 0
+
+        survivors = []
+        for index, track in enumerate(self.tracks):
+            if index not in matched_tracks:
+                track.missed += 1
+                # Stop drifting once the face is no longer confirmed by detections
+                track.velocity = np.zeros(4)
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        for index, box in enumerate(boxes):
+            if index not in matched_boxes:
+                survivors.append(_Track(self._next_id, box.copy()))
+                self._next_id += 1
+        self.tracks = survivors
+
+    @property
+    def headcount(self) -> int:
+        return sum(1 for track in self.tracks if track.hits >= self.min_hits)
+
+    def faces(self) -> List[Dict]:
+        return [
+            {'id': track.id, 'bbox': [int(round(v)) for v in track.bbox]}
+            for track in self.tracks if track.hits >= self.min_hits
+        ]
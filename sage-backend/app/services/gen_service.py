@@ -1,7 +1,8 @@
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from app.core.rag import get_relevant_context
-from app.core.model import generate_from_model  
+from app.core.model import generate_from_model, stream_from_model
 
 # Create a thread pool for CPU-intensive tasks
 executor = ThreadPoolExecutor(max_workers=1)
@@ -48,3 +49,41 @@ async def generate_llm_response(query: str, history: list[dict]) -> str:
     """Async wrapper for RAG-based response generation"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, _generate_response_with_context, query, history)
+
+async def generate_from_prompt(prompt: str) -> str:
+    """Async wrapper for a raw prompt, sharing the generation executor"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, generate_from_model, prompt)
+
+async def stream_from_prompt(prompt: str):
+    """Async iterator over response text pieces as the model generates them.
+
+    Closing the iterator early (e.g. with contextlib.aclosing when the client
+    goes away) stops generation at the next token and frees the executor.
+    """
+    loop = asyncio.get_event_loop()
+    pieces = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for piece in stream_from_model(prompt, stop):
+                loop.call_soon_threadsafe(pieces.put_nowait, piece)
+        finally:
+            loop.call_soon_threadsafe(pieces.put_nowait, None)
+
+    generation = loop.run_in_executor(executor, produce)
+    finished = False
+    try:
+        while True:
+            piece = await pieces.get()
+            if piece is None:
+                break
+            yield piece
+        finished = True
+    finally:
+        stop.set()
+        if not finished:
+            # The worker ends within a token; nobody is left to see its result
+            generation.cancel()
+    await generation  # surface generation errors
@@ -0,0 +1,97 @@
+# app/services/image_preprocessing.py
+import hashlib
+import io
+import threading
+from functools import cached_property
+import numpy as np
+from PIL import Image, ImageOps
+
+# Tesseract is tuned for ~300 DPI text
+OCR_TARGET_DPI = 300
+# Cap on the long side of the OCR view; phone photos gain nothing beyond this
+OCR_MAX_SIDE = 2500
+# DPI metadata is only a real scan resolution in this range; phones write 72, screenshots 96
+OCR_SCAN_DPI_RANGE = (150, 1200)
+# BLIP's vision encoder works at 384x384
+BLIP_IMAGE_SIZE = 384
+
+class PreparedImage:
+    """An uploaded image decoded once, with task-specific views built lazily.
+
+    Every view is derived from the same decoded, EXIF-oriented buffer, so a
+    request that needs both OCR and vision analysis pays for one decode.
+    Decoding itself is deferred until a view is first needed, so requests
+    served entirely from caches never decode at all.
+    """
+
+    def __init__(self, image_bytes: bytes):
+        self.data = image_bytes
+        self.content_hash = hashlib.sha256(image_bytes).hexdigest()
+        self.dpi = None
+        self._image = None
+        self._decode_lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        # OCR and vision threads may ask for views at the same time; decode once
+        if self._image is None:
+            with self._decode_lock:
+                if self._image is None:
+                    self._image = self._decode()
+        return self._image
+
+    def _decode(self) -> Image.Image:
+        image = Image.open(io.BytesIO(self.data))
+        self.dpi = image.info.get("dpi")
+        image.load()
+        # Rotate phone photos upright before any view is derived
+        ImageOps.exif_transpose(image, in_place=True)
+        return image
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @cached_property
+    def rgb(self) -> Image.Image:
+        if self.image.mode == "RGB":
+            return self.image
+        return self.image.convert("RGB")
+
+    @cached_property
+    def ocr_view(self) -> Image.Image:
+        """Grayscale view rescaled towards the OCR target DPI"""
+        gray = self.image.convert("L")
+        low, high = OCR_SCAN_DPI_RANGE
+        if self.dpi and low <= float(self.dpi[0]) <= high:
+            scale = OCR_TARGET_DPI / float(self.dpi[0])
+        else:
+            scale = 1.0
+        scale = min(scale, OCR_MAX_SIDE / max(gray.size))
+        # Ignore tiny rescales; they cost a resample without helping Tesseract
+        if abs(scale - 1.0) > 0.1:
+            new_size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+            gray = gray.resize(new_size, Image.Resampling.BICUBIC)
+        return gray
+
+    @cached_property
+    def blip_view(self) -> Image.Image:
+        """RGB view at BLIP's input resolution, so the processor needn't resize"""
+        # reduce() is a cheap box-filter pre-shrink before the final resample
+        source = self.rgb
+        factor = min(source.width, source.height) // (BLIP_IMAGE_SIZE * 2)
+        if factor > 1:
+            source = source.reduce(factor)
+        return source.resize((BLIP_IMAGE_SIZE, BLIP_IMAGE_SIZE), Image.Resampling.BICUBIC)
+
+    def bgr(self, max_width: int | None = None) -> np.ndarray:
+        """OpenCV-style BGR array, optionally downscaled to max_width"""
+        source = self.rgb
+        if max_width is not None and source.width > max_width:
+            scale = max_width / source.width
+            source = source.resize((max_width, int(source.height * scale)), Image.Resampling.BILINEAR)
+        # Reverse channels in place of a cv2.cvtColor round trip
+        return np.ascontiguousarray(np.asarray(source)[:, :, ::-1])
+
+def prepare_image(image_bytes: bytes) -> PreparedImage:
+    return PreparedImage(image_bytes)
@@ -0,0 +1,71 @@
+# app/services/ocr_service.py
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import pytesseract
+from PIL import Image
+from app.services.image_preprocessing import PreparedImage
+from app.services.disk_cache import DiskLRUCache
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+# OCR (temp-file encode, tesseract) runs in worker processes so it never
+# competes with the event loop for the GIL
+ocr_executor = ProcessPoolExecutor(max_workers=2)
+
+# On-disk OCR results keyed by image content hash
+OCR_CACHE_DIR = "ocr_cache"
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class OCRCache(DiskLRUCache):
+    """Content-addressed OCR text cache on disk, one <hash>.txt file per image"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        super().__init__(directory, max_bytes, pattern=r"^(.+)\.txt$")
+
+    def filename(self, key: str) -> str:
+        return f"{key}.txt"
+
+    def get(self, key: str) -> str | None:
+        if not self.lookup(key):
+            return None
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            self.discard(key)
+            return None
+
+    def put(self, key: str, text: str):
+        self.write(key, text.encode("utf-8"))
+
+ocr_cache = OCRCache(OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES)
+
+def extract_text_from_image(image: Image.Image) -> str:
+    """Run Tesseract on an already decoded image"""
+    return pytesseract.image_to_string(image, config='--psm 6')
+
+def chunks_from_ocr_text(extracted_text: str) -> list[str]:
+    """Split OCR output into knowledge-base chunks (one per substantial line)"""
+    return [chunk.strip() for chunk in extracted_text.split('\n') if chunk.strip() and len(chunk.strip()) > 20]
+
+def extract_text_chunks_from_image(path: str) -> list[str]:
+    with open(path, "rb") as f:
+        prepared = PreparedImage(f.read())
+    return chunks_from_ocr_text(extract_text_from_image(prepared.ocr_view))
+
+async def extract_text_async(prepared: PreparedImage) -> str:
+    """Run OCR in the process pool without blocking the event loop.
+
+    Results are cached by image content hash; a hit skips decoding and
+    Tesseract entirely. On a miss only the grayscale OCR view (one byte per
+    pixel) is shipped to the worker, so the image is never decoded twice.
+    """
+    loop = asyncio.get_event_loop()
+    cached = await loop.run_in_executor(None, ocr_cache.get, prepared.content_hash)
+    if cached is not None:
+        return cached
+
+    ocr_view = await loop.run_in_executor(None, lambda: prepared.ocr_view)
+    text = await loop.run_in_executor(ocr_executor, extract_text_from_image, ocr_view)
+    await loop.run_in_executor(None, ocr_cache.put, prepared.content_hash, text)
+    return text
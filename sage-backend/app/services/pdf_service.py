@@ -1,7 +1,8 @@
 from PyPDF2 import PdfReader
-from app.core.rag import build_index_from_chunks
+from app.core.rag import build_index_from_chunks, hash_file, find_known_file
 
-def extract_text_chunks_from_pdf(path: str):
+def read_pdf_text(path: str) -> tuple[str, int]:
+    """Return the concatenated text of a PDF and its page count"""
     reader = PdfReader(path)
     all_text = ""
     
@@ -11,6 +12,13 @@ def extract_text_chunks_from_pdf(path: str):
         if text:
             all_text += text + " "
     
+    return all_text, len(reader.pages)
+
+def extract_text_chunks_from_pdf(path: str):
+    all_text, _ = read_pdf_text(path)
+    return chunk_text(all_text)
+
+def chunk_text(all_text: str) -> list[str]:
     # Create better chunks (sentences or paragraphs)
     paragraphs = all_text.split('\n\n')
     chunks = []
@@ -40,8 +48,24 @@ def extract_text_chunks_from_pdf(path: str):
 
 import os
 
-def process_pdf_and_build_index(pdf_path: str):
-    chunks = extract_text_chunks_from_pdf(pdf_path)
+def process_pdf_and_build_index(pdf_path: str) -> dict:
     pdf_name = os.path.basename(pdf_path)
+
+    # Skip files whose exact bytes were already indexed (e.g. renamed re-uploads)
+    file_hash = hash_file(pdf_path)
+    known_name = find_known_file(file_hash)
+    if known_name is not None:
+        print(f"Skipping {pdf_name}: identical to already indexed {known_name}")
+        return {
+            "duplicate_of": known_name,
+            "chunks_total": 0,
+            "chunks_added": 0,
+            "chunks_deduplicated": 0,
+            "dedup_ratio": 1.0
+        }
+
+    chunks = extract_text_chunks_from_pdf(pdf_path)
     print(f"Extracted {len(chunks)} chunks from PDF")  # Debug info
-    build_index_from_chunks(chunks, pdf_name)
+    stats = build_index_from_chunks(chunks, pdf_name, file_hash)
+    stats["duplicate_of"] = None
+    return stats
@@ -0,0 +1,83 @@
+# app/services/session_service.py
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+# Bounds so abandoned sessions can't grow memory without limit
+MAX_SESSIONS = 1000
+MAX_MESSAGES_PER_SESSION = 8
+SESSION_TTL_SECONDS = 3600
+
+class _Mailbox:
+    def __init__(self):
+        self.messages = deque(maxlen=MAX_MESSAGES_PER_SESSION)
+        self.event = asyncio.Event()
+        self.touched = time.monotonic()
+
+class ResponseMailboxes:
+    """Per-session queues of voice results, with long-poll reads.
+
+    Results are normally pushed straight to the originating websocket; a
+    mailbox only holds them when the socket is gone. Each mailbox is bounded
+    and the least recently used sessions are dropped past MAX_SESSIONS.
+    """
+
+    def __init__(self):
+        self.mailboxes: "OrderedDict[str, _Mailbox]" = OrderedDict()
+
+    def _mailbox(self, session_id: str) -> _Mailbox:
+        mailbox = self.mailboxes.get(session_id)
+        if mailbox is None:
+            mailbox = self.mailboxes[session_id] = _Mailbox()
+        self.mailboxes.move_to_end(session_id)
+        mailbox.touched = time.monotonic()
+        self._evict()
+        return mailbox
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.mailboxes:
+            session_id, oldest = next(iter(self.mailboxes.items()))
+            if len(self.mailboxes) > MAX_SESSIONS or now - oldest.touched > SESSION_TTL_SECONDS:
+                self.mailboxes.popitem(last=False)
+            else:
+                break
+
+    def put(self, session_id: str, result: Dict):
+        mailbox = self._mailbox(session_id)
+        mailbox.messages.append(result)
+        mailbox.event.set()
+
+    def pop(self, session_id: str) -> Optional[Dict]:
+        mailbox = self.mailboxes.get(session_id)
+        if mailbox is None or not mailbox.messages:
+            return None
+        result = mailbox.messages.popleft()
+        if not mailbox.messages:
+            mailbox.event.clear()
+        return result
+
+    async def wait(self, session_id: str, timeout: float) -> Optional[Dict]:
+        """Return the next result for a session, waiting up to `timeout` seconds"""
+        result = self.pop(session_id)
+        if result is not None or timeout <= 0:
+            return result
+        mailbox = self._mailbox(session_id)
+        try:
+            await asyncio.wait_for(mailbox.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.pop(session_id)
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self.mailboxes),
+            "pending_results": sum(len(mailbox.messages) for mailbox in self.mailboxes.values())
+        }
+
+response_mailboxes = ResponseMailboxes()
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
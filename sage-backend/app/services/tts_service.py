@@ -1,9 +1,20 @@
 # app/services/tts_service.py
 import os
-import uuid
-from typing import Optional
+import re
+import hashlib
+import multiprocessing
+import queue
+import struct
+import threading
+import wave
+from typing import AsyncIterator, Optional
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from app.services.utils import split_sentences
+from app.services.tts_worker import run_worker
+from app.services.audio_formats import encode_audio
+from app.services.artifact_service import artifact_janitor
+from app.services.disk_cache import DiskLRUCache
 
 try:
     import pyttsx3
@@ -13,9 +24,6 @@ except ImportError:
     TTS_AVAILABLE = False
     print("pyttsx3 not available")
 
-executor = ThreadPoolExecutor(max_workers=1)
-tts_engine = None
-
 # TTS Settings
 TTS_SETTINGS = {
     'rate': 180,        # Speech rate (words per minute)
@@ -23,61 +31,306 @@ TTS_SETTINGS = {
     'voice_index': 0    # Voice index (0 = first available voice)
 }
 
+# Worker pool: each process owns its own pyttsx3 engine
+TTS_POOL_SETTINGS = {
+    'workers': max(1, min(4, (os.cpu_count() or 2) // 2)),
+    'timeout_s': 30.0,          # Per-request limit before a worker is restarted
+    'startup_timeout_s': 30.0
+}
+
+# Threads only wait on worker pipes; one per worker process
+executor = ThreadPoolExecutor(max_workers=TTS_POOL_SETTINGS['workers'])
+# Compression of synthesized WAV to Opus/MP3
+encode_executor = ThreadPoolExecutor(max_workers=2)
+tts_pool = None
+
+AUDIO_DIR = os.path.join("static", "audio")
+TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Audio not replayed for this long is dropped even under the size quota
+TTS_CACHE_MAX_IDLE_SECONDS = 7 * 24 * 3600
+# Streaming speech is synthesized in segments of at most this many characters
+TTS_SEGMENT_CHARS = 500
+# Segments synthesized ahead of the one currently being streamed
+TTS_STREAM_LOOKAHEAD = 3
+STREAM_CHUNK_BYTES = 32 * 1024
+
+class TTSCache(DiskLRUCache):
+    """Content-addressed cache of synthesized audio.
+
+    Files are named tts_<hash>.<format>, where the hash covers the spoken
+    text and the voice settings, so a repeated answer is served from disk
+    instead of being synthesized (or encoded) again. Cache keys are the
+    "<hash>.<format>" part.
+    """
+
+    FILENAME = re.compile(r"^tts_([0-9a-f]{64}\.(?:wav|ogg|mp3))$")
+
+    def __init__(self, directory: str, max_bytes: int, max_idle_seconds: float):
+        # Other tts_ files are leftovers of interrupted writes or older naming
+        super().__init__(directory, max_bytes, self.FILENAME.pattern, max_idle_seconds, stray_prefix="tts_")
+
+    def filename(self, key: str) -> str:
+        return f"tts_{key}"
+
+    def get(self, key: str) -> bool:
+        """Whether audio for `key` is cached, counting the lookup"""
+        return self.lookup(key)
+
+    def put(self, key: str, size: int):
+        """Record a newly written file and evict least recently used audio past the bound"""
+        self.add(key, size)
+
+tts_cache = artifact_janitor.register("audio", TTSCache(AUDIO_DIR, TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_IDLE_SECONDS))
+# Syntheses in progress, so concurrent requests for the same audio share one run
+_pending_speech: dict[str, asyncio.Future] = {}
+
+def normalize_tts_text(text: str) -> str:
+    """The text actually spoken, with whitespace collapsed"""
+    return " ".join(text.split())
+
+def split_for_speech(text: str) -> list[str]:
+    """Split text into sentences, breaking overlong ones at word boundaries"""
+    segments = []
+    for sentence in split_sentences(normalize_tts_text(text)):
+        while len(sentence) > TTS_SEGMENT_CHARS:
+            cut = sentence.rfind(" ", 0, TTS_SEGMENT_CHARS)
+            if cut <= 0:
+                cut = TTS_SEGMENT_CHARS
+            segments.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            segments.append(sentence)
+    return segments
+
+def speech_cache_key(text: str) -> str:
+    """Hash of normalized text and the voice settings that shape the audio"""
+    voice = f"{TTS_SETTINGS['rate']}|{TTS_SETTINGS['volume']}|{TTS_SETTINGS['voice_index']}"
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+class TTSWorkerError(Exception):
+    pass
+
+class TTSWorker:
+    """Parent-side handle of one TTS worker process"""
+
+    def __init__(self, pool, slot: int):
+        self.pool = pool
+        self.slot = slot
+        self.process = None
+        self.conn = None
+        self.settings_version = -1
+        self.restarts = -1
+
+    def start(self):
+        parent_conn, child_conn = self.pool.context.Pipe()
+        version, settings = self.pool.settings_version, dict(TTS_SETTINGS)
+        self.process = self.pool.context.Process(
+            target=run_worker, args=(child_conn, settings), name=f"tts-worker-{self.slot}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.settings_version = version
+        self.restarts += 1
+        status, payload = self._receive(TTS_POOL_SETTINGS['startup_timeout_s'])
+        if status != "ready":
+            self.stop()
+            raise TTSWorkerError(f"TTS worker failed to start: {payload}")
+        return payload
+
+    def stop(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+            self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def _receive(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"TTS worker {self.slot} did not answer within {timeout:.0f}s")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise TTSWorkerError(f"TTS worker {self.slot} died: {e}")
+
+    def call(self, request, timeout: float):
+        # Settings changed since this worker last heard; catch it up first
+        if self.settings_version != self.pool.settings_version:
+            version = self.pool.settings_version
+            self.conn.send(("settings", dict(TTS_SETTINGS)))
+            self._receive(timeout)
+            self.settings_version = version
+        self.conn.send(request)
+        status, payload = self._receive(timeout)
+        if status != "ok":
+            raise TTSWorkerError(payload)
+        return payload
+
+class TTSWorkerPool:
+    """Pool of TTS processes, each owning its own pyttsx3 engine.
+
+    A request borrows an idle worker; one that times out or dies is killed
+    and replaced, so a hung engine only fails its own request. Settings
+    changes bump a version that each worker applies before its next request.
+    """
+
+    def __init__(self, size: int):
+        # spawn: forking a process that holds threads and audio drivers is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [TTSWorker(self, slot) for slot in range(size)]
+        self.idle = queue.Queue()
+        self.settings_version = 0
+        self.voices = []
+        self.busy = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            self.voices = worker.start()
+            self.idle.put(worker)
+
+    def shutdown(self):
+        for worker in self.workers:
+            if worker.conn is not None:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+            worker.stop()
+
+    def broadcast_settings(self):
+        with self._lock:
+            self.settings_version += 1
+
+    def run(self, request, timeout: float | None = None):
+        timeout = TTS_POOL_SETTINGS['timeout_s'] if timeout is None else timeout
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No TTS worker became available")
+        with self._lock:
+            self.busy += 1
+        try:
+            result = worker.call(request, timeout)
+            with self._lock:
+                self.completed += 1
+            return result
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            print(f"TTS worker {worker.slot} timed out; restarting it")
+            self._replace(worker)
+            raise
+        except TTSWorkerError:
+            with self._lock:
+                self.failures += 1
+            if worker.process is None or not worker.process.is_alive():
+                self._replace(worker)
+            raise
+        finally:
+            with self._lock:
+                self.busy -= 1
+            if worker.process is not None:
+                self.idle.put(worker)
+
+    def _replace(self, worker: TTSWorker):
+        try:
+            worker.restart()
+        except Exception as e:
+            # Left stopped; it is retried the next time this slot fails
+            print(f"Could not restart TTS worker {worker.slot}: {e}")
+            worker.stop()
+            self._schedule_retry(worker)
+
+    def _schedule_retry(self, worker: TTSWorker):
+        timer = threading.Timer(TTS_POOL_SETTINGS['timeout_s'], self._retry, args=(worker,))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, worker: TTSWorker):
+        try:
+            worker.start()
+            self.idle.put(worker)
+        except Exception as e:
+            print(f"Could not restart TTS worker {worker.slot}: {e}")
+            self._schedule_retry(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": len(self.workers),
+                "alive": sum(1 for worker in self.workers if worker.process is not None and worker.process.is_alive()),
+                "busy": self.busy,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "restarts": sum(max(0, worker.restarts) for worker in self.workers)
+            }
+
 def initialize_tts():
-    """Initialize TTS engine"""
-    global tts_engine, TTS_AVAILABLE
+    """Start the TTS worker processes"""
+    global tts_pool, TTS_AVAILABLE
     
     if not TTS_AVAILABLE:
         print("TTS not available - pyttsx3 not installed")
         return False
     
+    if tts_pool is not None:
+        return True
+    
+    pool = TTSWorkerPool(TTS_POOL_SETTINGS['workers'])
     try:
-        tts_engine = pyttsx3.init()
-        
-        # Set properties from settings
-        tts_engine.setProperty('rate', TTS_SETTINGS['rate'])
-        tts_engine.setProperty('volume', TTS_SETTINGS['volume'])
+        pool.start()
+        tts_pool = pool
         
-        # Configure voice
-        voices = tts_engine.getProperty('voices')
-        if voices and len(voices) > 0:
-            # Try to use the configured voice index
-            voice_index = min(TTS_SETTINGS['voice_index'], len(voices) - 1)
-            tts_engine.setProperty('voice', voices[voice_index].id)
-            print(f"Using voice: {voices[voice_index].name}")
+        if pool.voices:
+            voice_index = min(TTS_SETTINGS['voice_index'], len(pool.voices) - 1)
+            print(f"Using voice: {pool.voices[voice_index]['name']}")
         
-        print(f"TTS initialized - Rate: {TTS_SETTINGS['rate']}, Volume: {TTS_SETTINGS['volume']}")
+        print(f"TTS initialized - {len(pool.workers)} workers, Rate: {TTS_SETTINGS['rate']}, Volume: {TTS_SETTINGS['volume']}")
         return True
         
     except Exception as e:
         print(f"TTS initialization failed: {e}")
         TTS_AVAILABLE = False
-        tts_engine = None
+        pool.shutdown()
+        tts_pool = None
         return False
 
 def update_tts_settings(rate: int = None, volume: float = None, voice_index: int = None):
-    """Update TTS settings dynamically"""
-    global tts_engine, TTS_SETTINGS
+    """Update TTS settings on every worker"""
+    global TTS_SETTINGS
     
-    if not TTS_AVAILABLE or not tts_engine:
+    if not TTS_AVAILABLE or not tts_pool:
         return False
     
     try:
         if rate is not None:
             TTS_SETTINGS['rate'] = max(50, min(400, rate))  # Clamp between 50-400
-            tts_engine.setProperty('rate', TTS_SETTINGS['rate'])
         
         if volume is not None:
             TTS_SETTINGS['volume'] = max(0.0, min(1.0, volume))  # Clamp between 0-1
-            tts_engine.setProperty('volume', TTS_SETTINGS['volume'])
         
         if voice_index is not None:
-            voices = tts_engine.getProperty('voices')
+            voices = tts_pool.voices
             if voices and 0 <= voice_index < len(voices):
                 TTS_SETTINGS['voice_index'] = voice_index
-                tts_engine.setProperty('voice', voices[voice_index].id)
-                print(f"Voice changed to: {voices[voice_index].name}")
+                print(f"Voice changed to: {voices[voice_index]['name']}")
         
+        # Workers pick the new settings up before their next request
+        tts_pool.broadcast_settings()
         return True
     except Exception as e:
         print(f"Error updating TTS settings: {e}")
@@ -85,45 +338,77 @@ def update_tts_settings(rate: int = None, volume: float = None, voice_index: int
 
 def get_available_voices():
     """Get list of available voices"""
-    if not TTS_AVAILABLE or not tts_engine:
+    if not TTS_AVAILABLE or not tts_pool:
         return []
     
-    try:
-        voices = tts_engine.getProperty('voices')
-        return [{'index': i, 'name': voice.name, 'id': voice.id} for i, voice in enumerate(voices)]
-    except:
-        return []
+    return list(tts_pool.voices)
 
 def _generate_speech_sync(text: str, output_path: str) -> bool:
-    """Generate speech synchronously"""
-    global tts_engine, TTS_AVAILABLE
-    
-    if not TTS_AVAILABLE or not tts_engine:
+    """Generate speech on a pool worker, blocking until it finishes"""
+    if not TTS_AVAILABLE or not tts_pool:
         return False
     
     try:
-        # Clean text
-        text = text.strip()
         if not text:
             return False
         
-        # Limit text length
-        if len(text) > 500:
-            text = text[:497] + "..."
-        
-        # Generate speech
-        tts_engine.save_to_file(text, output_path)
-        tts_engine.runAndWait()
+        # Write under a temporary name so a half-written file is never served
+        partial_path = output_path + ".part.wav"
+        tts_pool.run(("speak", text, partial_path))
         
         # Check if file was created
-        return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        if not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0:
+            return False
+        os.replace(partial_path, output_path)
+        return True
         
     except Exception as e:
         print(f"TTS generation error: {e}")
         return False
 
-async def generate_speech(text: str) -> Optional[str]:
-    """Generate speech from text and return file path"""
+async def _cached_audio(key: str, build) -> bool:
+    """Ensure the cache holds `key`, running `build(path)` at most once concurrently"""
+    if tts_cache.get(key):
+        return True
+    
+    # Another request is already producing this file; share its result
+    pending = _pending_speech.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    
+    loop = asyncio.get_event_loop()
+    pending = _pending_speech[key] = loop.create_future()
+    success = False
+    try:
+        os.makedirs(AUDIO_DIR, exist_ok=True)
+        audio_path = tts_cache.path(key)
+        success = await build(audio_path)
+        if success:
+            tts_cache.put(key, os.path.getsize(audio_path))
+    finally:
+        pending.set_result(success)
+        del _pending_speech[key]
+    return success
+
+def _encode_speech_sync(wav_path: str, output_path: str, audio_format: str) -> bool:
+    """Encode synthesized WAV, writing under a temporary name like synthesis does"""
+    partial_path = f"{output_path}.part.{audio_format}"
+    if not encode_audio(wav_path, partial_path, audio_format):
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        return False
+    os.replace(partial_path, output_path)
+    return True
+
+async def generate_speech(text: str, audio_format: str = "wav") -> Optional[str]:
+    """Generate speech from text and return its URL.
+
+    `audio_format` is "wav", "ogg" (Opus) or "mp3"; compressed audio is
+    encoded from the cached WAV off the event loop. If encoding fails the
+    WAV is returned instead.
+    """
     global TTS_AVAILABLE
     
     if not TTS_AVAILABLE:
@@ -131,59 +416,125 @@ async def generate_speech(text: str) -> Optional[str]:
         return None
     
     try:
-        # Create unique filename
-        audio_filename = f"tts_{uuid.uuid4().hex[:8]}.wav"
-        audio_path = os.path.join("static", "audio", audio_filename)
-        
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        text = normalize_tts_text(text)
+        if not text:
+            return None
         
-        # Generate speech in thread pool
         loop = asyncio.get_event_loop()
-        success = await loop.run_in_executor(
-            executor, 
-            _generate_speech_sync, 
-            text, 
-            audio_path
-        )
+        digest = speech_cache_key(text)
+        wav_key = f"{digest}.wav"
         
-        if success:
-            return f"/static/audio/{audio_filename}"
-        else:
-            return None
+        async def synthesize(path: str) -> bool:
+            return await loop.run_in_executor(executor, _generate_speech_sync, text, path)
+        
+        if audio_format != "wav":
+            async def encode(path: str) -> bool:
+                if not await _cached_audio(wav_key, synthesize):
+                    return False
+                return await loop.run_in_executor(
+                    encode_executor, _encode_speech_sync, tts_cache.path(wav_key), path, audio_format
+                )
+            
+            encoded_key = f"{digest}.{audio_format}"
+            if await _cached_audio(encoded_key, encode):
+                return f"/static/audio/{tts_cache.filename(encoded_key)}"
+        
+        if await _cached_audio(wav_key, synthesize):
+            return f"/static/audio/{tts_cache.filename(wav_key)}"
+        return None
             
     except Exception as e:
         print(f"Async TTS error: {e}")
         return None
 
-def cleanup_old_audio_files():
-    """Clean up old TTS files"""
+async def speech_file_in_format(filename: str, audio_format: str) -> Optional[str]:
+    """Path of a cached TTS file in the requested format, encoding it from the WAV if needed"""
+    match = TTSCache.FILENAME.match(filename)
+    if not match:
+        return None
+    
+    digest, current_format = match.group(1).split(".")
+    if current_format == audio_format or audio_format == "wav":
+        path = tts_cache.path(f"{digest}.{audio_format}")
+        return path if os.path.exists(path) else None
+    
+    wav_key = f"{digest}.wav"
+    loop = asyncio.get_event_loop()
+    
+    async def encode(path: str) -> bool:
+        if not os.path.exists(tts_cache.path(wav_key)):
+            return False
+        return await loop.run_in_executor(
+            encode_executor, _encode_speech_sync, tts_cache.path(wav_key), path, audio_format
+        )
+    
+    key = f"{digest}.{audio_format}"
+    return tts_cache.path(key) if await _cached_audio(key, encode) else None
+
+def _wav_stream_header(channels: int, sample_width: int, frame_rate: int) -> bytes:
+    """WAV header for PCM of unknown length (sizes set to the maximum, as streamers do)"""
+    block_align = channels * sample_width
+    return b"".join([
+        b"RIFF", struct.pack("<I", 0xFFFFFFFF), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, frame_rate,
+                             frame_rate * block_align, block_align, sample_width * 8),
+        b"data", struct.pack("<I", 0xFFFFFFFF - 36)
+    ])
+
+def _read_wav(path: str) -> tuple[tuple, bytes] | None:
+    """(channels, sample width, frame rate) and PCM frames of a WAV file"""
     try:
-        audio_dir = os.path.join("static", "audio")
-        if not os.path.exists(audio_dir):
-            return
+        with wave.open(path, "rb") as wav:
+            params = (wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+            return params, wav.readframes(wav.getnframes())
+    except (OSError, EOFError, wave.Error) as e:
+        print(f"Could not read TTS audio {path}: {e}")
+        return None
+
+async def stream_speech(text: str) -> AsyncIterator[bytes]:
+    """Speak text of any length as one continuous WAV stream.
+
+    Text is split into sentences which are synthesized in order, a few
+    ahead of the one being sent, so playback can begin once the first
+    sentence is ready. Each sentence goes through generate_speech and so
+    lands in (or comes from) the audio cache.
+    """
+    segments = split_for_speech(text)
+    loop = asyncio.get_event_loop()
+    tasks = {}
+    params = None
+    
+    for index, segment in enumerate(segments):
+        for ahead in range(index, min(index + TTS_STREAM_LOOKAHEAD + 1, len(segments))):
+            if ahead not in tasks:
+                tasks[ahead] = asyncio.ensure_future(generate_speech(segments[ahead]))
+        audio_url = await tasks.pop(index)
+        if audio_url is None:
+            continue
         
-        import time
-        current_time = time.time()
+        audio = await loop.run_in_executor(None, _read_wav, audio_url.lstrip("/"))
+        if audio is None:
+            continue
+        segment_params, frames = audio
+        if params is None:
+            params = segment_params
+            yield _wav_stream_header(*params)
+        elif segment_params != params:
+            print(f"Skipping TTS segment {index} with mismatched format {segment_params}")
+            continue
         
-        for filename in os.listdir(audio_dir):
-            if filename.startswith("tts_"):
-                file_path = os.path.join(audio_dir, filename)
-                if current_time - os.path.getctime(file_path) > 3600:  # 1 hour
-                    try:
-                        os.remove(file_path)
-                    except OSError:
-                        pass
-    except Exception as e:
-        print(f"Cleanup error: {e}")
+        for start in range(0, len(frames), STREAM_CHUNK_BYTES):
+            yield frames[start:start + STREAM_CHUNK_BYTES]
 
 def get_tts_status():
     """Get TTS status"""
-    if TTS_AVAILABLE and tts_engine:
+    if TTS_AVAILABLE and tts_pool:
         return {
             "status": "Ready",
             "settings": TTS_SETTINGS,
-            "voices": get_available_voices()
+            "voices": get_available_voices(),
+            "workers": tts_pool.stats(),
+            "cache": tts_cache.stats()
         }
     else:
-        return {"status": "Not Available"}
\ No newline at end of file
+        return {"status": "Not Available", "cache": tts_cache.stats()}
@@ -0,0 +1,47 @@
+# app/services/tts_worker.py
+# Entry point of a TTS worker process. Kept free of app imports so spawning
+# a worker only pays for pyttsx3, not the web app's dependencies.
+
+def _apply_settings(engine, voices, settings: dict):
+    engine.setProperty('rate', settings['rate'])
+    engine.setProperty('volume', settings['volume'])
+    if voices:
+        voice_index = min(settings['voice_index'], len(voices) - 1)
+        engine.setProperty('voice', voices[voice_index].id)
+
+def run_worker(conn, settings: dict):
+    """Own one pyttsx3 engine and serve requests from the parent over a pipe.
+
+    Requests are ("speak", text, path), ("settings", dict) or None to exit;
+    every request gets exactly one reply.
+    """
+    try:
+        import pyttsx3
+        engine = pyttsx3.init()
+        voices = engine.getProperty('voices') or []
+        _apply_settings(engine, voices, settings)
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ready", [{'index': i, 'name': voice.name, 'id': voice.id} for i, voice in enumerate(voices)]))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        try:
+            if request[0] == "speak":
+                _, text, path = request
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+                conn.send(("ok", True))
+            elif request[0] == "settings":
+                _apply_settings(engine, voices, request[1])
+                conn.send(("ok", True))
+            else:
+                conn.send(("error", f"unknown request {request[0]!r}"))
+        except Exception as e:
+            conn.send(("error", str(e)))
@@ -1,6 +1,11 @@
 import matplotlib.pyplot as plt
 import os
+import re
 import uuid
+from app.services.artifact_service import record_artifact
+
+# A sentence ends at . ! or ? followed by whitespace (not inside numbers like 3.14)
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
 
 def maybe_generate_visual(text: str) -> str | None:
     if "chart" in text or "graph" in text:
@@ -9,7 +14,42 @@ def maybe_generate_visual(text: str) -> str | None:
         plt.plot(x, y)
         plt.title("Generated Chart")
         img_name = f"{uuid.uuid4()}.png"
-        img_path = os.path.join("static", img_name)
+        img_path = os.path.join("static", "charts", img_name)
+        os.makedirs(os.path.dirname(img_path), exist_ok=True)
         plt.savefig(img_path)
-        return f"/static/{img_name}"
+        record_artifact("charts", img_path)
+        return f"/static/charts/{img_name}"
     return None
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+class SentenceBuffer:
+    """Accumulates streamed text and releases complete sentences"""
+
+    def __init__(self, min_length: int = 20):
+        self.min_length = min_length
+        self.buffer = ""
+
+    def add(self, text: str) -> list[str]:
+        self.buffer += text
+        parts = SENTENCE_END.split(self.buffer)
+        # The last part may still be growing
+        complete, self.buffer = parts[:-1], parts[-1]
+
+        # Merge very short sentences ("Yes.") into the next one
+        sentences = []
+        pending = ""
+        for sentence in complete:
+            pending = f"{pending} {sentence}".strip()
+            if len(pending) >= self.min_length:
+                sentences.append(pending)
+                pending = ""
+        if pending:
+            self.buffer = f"{pending} {self.buffer}"
+        return sentences
+
+    def flush(self) -> list[str]:
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
@@ -1,8 +1,13 @@
 # app/services/vision_service.py
 import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from PIL import Image
-import io
+import numpy as np
+from app.core.model_manager import model_manager
+from app.services.image_preprocessing import PreparedImage, BLIP_IMAGE_SIZE
 
 # Try to import vision models
 try:
@@ -14,106 +19,403 @@ except ImportError:
     VISION_AVAILABLE = False
     print("Vision AI not available - install transformers and torch")
 
+# OpenVINO is optional; without it the PyTorch model serves every tier
+try:
+    import openvino as ov
+    OPENVINO_AVAILABLE = True
+except ImportError:
+    OPENVINO_AVAILABLE = False
+
+VISION_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+OV_VISION_DIR = os.path.join("models", "blip-openvino")
+
+# Vision settings
+VISION_SETTINGS = {
+    'backend': 'openvino' if OPENVINO_AVAILABLE else 'pytorch',
+    'int8': True,               # Weight-only INT8 compression of the exported OpenVINO models
+    'default_mode': 'quality',  # 'quality' = beam search, 'fast' = greedy decoding
+    'num_beams': 5,
+    'encoder_cache_size': 16    # Images whose encoder output is kept for follow-up questions
+}
+
 # Global variables for model
 vision_processor = None
 vision_model = None
+ov_vision_encoder = None
+ov_text_decoder = None
+# Backend actually serving the loaded model; VISION_SETTINGS['backend'] is only the preference
+active_backend = None
 executor = ThreadPoolExecutor(max_workers=1)
 
+# Vision-encoder outputs keyed by image content hash
+_encoder_cache = OrderedDict()
+_encoder_cache_lock = threading.Lock()
+_encoder_cache_hits = 0
+
+# Caption latency per (backend, mode): [count, total_seconds]
+_latency_stats = {}
+
+class _TextDecoderWrapper(torch.nn.Module if VISION_AVAILABLE else object):
+    """Exposes BLIP's text decoder as logits = f(input_ids, attention_mask, image_embeds)"""
+
+    def __init__(self, text_decoder):
+        super().__init__()
+        self.text_decoder = text_decoder
+
+    def forward(self, input_ids, attention_mask, encoder_hidden_states):
+        return self.text_decoder(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            encoder_hidden_states=encoder_hidden_states,
+            return_dict=False
+        )[0]
+
+def _export_openvino_models():
+    """Convert (once) and compile the BLIP vision encoder and text decoder with OpenVINO"""
+    global ov_vision_encoder, ov_text_decoder
+
+    suffix = "-int8" if VISION_SETTINGS['int8'] else ""
+    encoder_path = os.path.join(OV_VISION_DIR, f"vision_encoder{suffix}.xml")
+    decoder_path = os.path.join(OV_VISION_DIR, f"text_decoder{suffix}.xml")
+    core = ov.Core()
+
+    if not (os.path.exists(encoder_path) and os.path.exists(decoder_path)):
+        print("Exporting BLIP to OpenVINO (first run only)...")
+        os.makedirs(OV_VISION_DIR, exist_ok=True)
+        pixel_values = torch.zeros(1, 3, BLIP_IMAGE_SIZE, BLIP_IMAGE_SIZE)
+        with torch.no_grad():
+            image_embeds = vision_model.vision_model(pixel_values)[0]
+            encoder = ov.convert_model(vision_model.vision_model, example_input=pixel_values)
+            decoder = ov.convert_model(
+                _TextDecoderWrapper(vision_model.text_decoder),
+                example_input={
+                    "input_ids": torch.ones(1, 4, dtype=torch.long),
+                    "attention_mask": torch.ones(1, 4, dtype=torch.long),
+                    "encoder_hidden_states": image_embeds
+                }
+            )
+        if VISION_SETTINGS['int8']:
+            try:
+                import nncf
+                encoder = nncf.compress_weights(encoder)
+                decoder = nncf.compress_weights(decoder)
+            except ImportError:
+                print("nncf not installed - keeping FP32 OpenVINO models")
+        ov.save_model(encoder, encoder_path)
+        ov.save_model(decoder, decoder_path)
+
+    config = {"PERFORMANCE_HINT": "LATENCY"}
+    ov_vision_encoder = core.compile_model(encoder_path, "CPU", config)
+    ov_text_decoder = core.compile_model(decoder_path, "CPU", config)
+
+def _load_vision():
+    """Load BLIP (and its OpenVINO export when enabled); called by the model manager"""
+    global vision_processor, vision_model, ov_vision_encoder, ov_text_decoder, active_backend
+
+    print("Loading BLIP vision model...")
+
+    # Load BLIP model for image captioning and VQA
+    vision_processor = BlipProcessor.from_pretrained(VISION_MODEL_NAME)
+    vision_model = BlipForConditionalGeneration.from_pretrained(VISION_MODEL_NAME)
+    vision_model.eval()
+
+    # Move to CPU (you can change to GPU if available)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    vision_model.to(device)
+
+    active_backend = 'pytorch'
+    if VISION_SETTINGS['backend'] == 'openvino' and device == "cpu":
+        # A failed export only affects this load; the next load tries OpenVINO again
+        try:
+            _export_openvino_models()
+            active_backend = 'openvino'
+            print("BLIP OpenVINO backend ready")
+        except Exception as e:
+            print(f"OpenVINO export failed, using PyTorch: {e}")
+            ov_vision_encoder = ov_text_decoder = None
+
+    print(f"Vision model loaded successfully on {device} ({active_backend})")
+    return vision_model
+
+def _unload_vision(_model):
+    global vision_processor, vision_model, ov_vision_encoder, ov_text_decoder, active_backend
+    vision_processor = None
+    vision_model = None
+    ov_vision_encoder = None
+    ov_text_decoder = None
+    active_backend = None
+    with _encoder_cache_lock:
+        _encoder_cache.clear()
+
+# BLIP loads on first use and unloads when idle
+vision_handle = model_manager.register("vision", _load_vision, _unload_vision)
+
 def initialize_vision():
-    """Initialize vision model on startup"""
-    global vision_processor, vision_model, VISION_AVAILABLE
-    
+    """Eagerly load the vision model (otherwise it loads on first use)"""
+    global VISION_AVAILABLE
+
     if not VISION_AVAILABLE:
         return False
-    
+
     try:
-        print("Loading BLIP vision model...")
-        
-        # Load BLIP model for image captioning and VQA
-        model_name = "Salesforce/blip-image-captioning-base"
-        vision_processor = BlipProcessor.from_pretrained(model_name)
-        vision_model = BlipForConditionalGeneration.from_pretrained(model_name)
-        
-        # Move to CPU (you can change to GPU if available)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        vision_model.to(device)
-        
-        print(f"Vision model loaded successfully on {device}")
-        return True
-        
+        with vision_handle.use():
+            return True
+
     except Exception as e:
         print(f"Vision model initialization failed: {e}")
         VISION_AVAILABLE = False
         return False
 
-def _analyze_image_sync(image_data: bytes, query: str) -> str:
+def _encode_images(images: list[PreparedImage]) -> np.ndarray:
+    """Run the vision encoder on a batch, reusing outputs for images seen recently"""
+    global _encoder_cache_hits
+
+    embeds = [None] * len(images)
+    missing = []
+    with _encoder_cache_lock:
+        for i, image_data in enumerate(images):
+            cached = _encoder_cache.get(image_data.content_hash)
+            if cached is not None:
+                _encoder_cache.move_to_end(image_data.content_hash)
+                _encoder_cache_hits += 1
+                embeds[i] = cached
+            else:
+                missing.append(i)
+
+    if missing:
+        pixel_values = vision_processor(
+            images=[images[i].blip_view for i in missing], return_tensors="np", do_resize=False
+        )["pixel_values"]
+        if ov_vision_encoder is not None:
+            new_embeds = ov_vision_encoder(pixel_values)[0]
+        else:
+            with torch.no_grad():
+                device = next(vision_model.parameters()).device
+                new_embeds = vision_model.vision_model(torch.from_numpy(pixel_values).to(device))[0].cpu().numpy()
+
+        with _encoder_cache_lock:
+            for row, i in enumerate(missing):
+                # Copy so the cache doesn't pin the whole batch array
+                embeds[i] = new_embeds[row:row + 1].copy()
+                _encoder_cache[images[i].content_hash] = embeds[i]
+            while len(_encoder_cache) > VISION_SETTINGS['encoder_cache_size']:
+                _encoder_cache.popitem(last=False)
+
+    return np.concatenate(embeds, axis=0)
+
+def _decoder_prompt(text: str | None) -> list[int]:
+    """Token ids BLIP's decoder starts from: [BOS] + optional text prefix, without [SEP]"""
+    bos_token_id = vision_model.config.text_config.bos_token_id
+    if not text:
+        return [bos_token_id]
+    input_ids = vision_processor.tokenizer(text)["input_ids"]
+    return [bos_token_id] + input_ids[1:-1]
+
+def _greedy_decode_openvino(image_embeds: np.ndarray, input_ids: list[int], max_length: int) -> list[list[int]]:
+    """Greedy decoding through the OpenVINO text decoder for a batch sharing one prompt"""
+    text_config = vision_model.config.text_config
+    batch_size = image_embeds.shape[0]
+    ids = np.tile(np.array([input_ids], dtype=np.int64), (batch_size, 1))
+    finished = np.zeros(batch_size, dtype=bool)
+    while ids.shape[1] < max_length and not finished.all():
+        logits = ov_text_decoder([ids, np.ones_like(ids), image_embeds])[0]
+        next_ids = logits[:, -1].argmax(axis=-1)
+        next_ids[finished] = text_config.pad_token_id
+        finished |= next_ids == text_config.sep_token_id
+        ids = np.concatenate([ids, next_ids[:, None].astype(np.int64)], axis=1)
+    return ids.tolist()
+
+def _generate_captions(images: list[PreparedImage], text: str | None, max_length: int, mode: str) -> list[str]:
+    """Caption a batch of images, loading BLIP first if it isn't resident"""
+    with vision_handle.use():
+        return _generate_captions_loaded(images, text, max_length, mode)
+
+def _generate_captions_loaded(images: list[PreparedImage], text: str | None, max_length: int, mode: str) -> list[str]:
+    """Caption a batch of images (optionally conditioned on a shared text prefix)"""
+    start = time.perf_counter()
+    image_embeds = _encode_images(images)
+    input_ids = _decoder_prompt(text)
+
+    if mode == 'fast' and ov_text_decoder is not None:
+        backend = 'openvino'
+        output_ids = _greedy_decode_openvino(image_embeds, input_ids, max_length)
+    else:
+        backend = 'pytorch'
+        text_config = vision_model.config.text_config
+        device = next(vision_model.parameters()).device
+        embeds = torch.from_numpy(image_embeds).to(device)
+        with torch.no_grad():
+            out = vision_model.text_decoder.generate(
+                input_ids=torch.tensor([input_ids] * len(images), device=device),
+                eos_token_id=text_config.sep_token_id,
+                pad_token_id=text_config.pad_token_id,
+                encoder_hidden_states=embeds,
+                encoder_attention_mask=torch.ones(embeds.shape[:-1], dtype=torch.long, device=device),
+                max_length=max_length,
+                num_beams=1 if mode == 'fast' else VISION_SETTINGS['num_beams']
+            )
+        output_ids = out.tolist()
+
+    stats = _latency_stats.setdefault(f"{backend}/{mode}", [0, 0.0])
+    stats[0] += 1
+    stats[1] += time.perf_counter() - start
+    return vision_processor.batch_decode(output_ids, skip_special_tokens=True)
+
+def _generate_caption(image_data: PreparedImage, text: str | None, max_length: int, mode: str) -> str:
+    return _generate_captions([image_data], text, max_length, mode)[0]
+
+def _caption_request(query: str) -> tuple[str | None, int]:
+    """Decoder prefix and max length for a query: plain caption or question-conditioned"""
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['caption', 'describe', 'what is', 'what are', 'what do you see']):
+        return None, 100
+    return query, 150
+
+def _format_answer(query: str, text: str | None, generated: str) -> str:
+    if text is None:
+        return f"I can see: {generated}. This appears to be an image showing {generated.lower()}."
+
+    # Clean up the answer
+    answer = generated
+    if answer.startswith(query):
+        answer = answer[len(query):].strip()
+
+    return answer if answer else "I can see the image but cannot provide a specific answer to that question."
+
+def _analyze_image_sync(image_data: PreparedImage | bytes, query: str, mode: str | None = None) -> str:
     """Synchronous image analysis"""
-    global vision_processor, vision_model, VISION_AVAILABLE
-    
-    if not VISION_AVAILABLE or not vision_model:
+    if not VISION_AVAILABLE:
         return "Vision AI not available. Please install required dependencies."
-    
+
     try:
-        # Open image
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Resize if too large (for performance)
-        if image.width > 512 or image.height > 512:
-            image.thumbnail((512, 512), Image.Resampling.LANCZOS)
-        
-        # Check if query is asking for specific analysis
-        query_lower = query.lower()
-        
-        if any(word in query_lower for word in ['caption', 'describe', 'what is', 'what are', 'what do you see']):
-            # Generate image caption
-            inputs = vision_processor(image, return_tensors="pt")
-            out = vision_model.generate(**inputs, max_length=100, num_beams=5)
-            caption = vision_processor.decode(out[0], skip_special_tokens=True)
-            
-            return f"I can see: {caption}. This appears to be an image showing {caption.lower()}."
-            
-        else:
-            # Answer specific question about the image
-            inputs = vision_processor(image, query, return_tensors="pt")
-            out = vision_model.generate(**inputs, max_length=150, num_beams=5)
-            answer = vision_processor.decode(out[0], skip_special_tokens=True)
-            
-            # Clean up the answer
-            if answer.startswith(query):
-                answer = answer[len(query):].strip()
-            
-            return answer if answer else "I can see the image but cannot provide a specific answer to that question."
-        
+        # Reuse the request's decoded image; it is already RGB at BLIP's input size
+        if not isinstance(image_data, PreparedImage):
+            image_data = PreparedImage(image_data)
+        mode = mode or VISION_SETTINGS['default_mode']
+
+        text, max_length = _caption_request(query)
+        return _format_answer(query, text, _generate_caption(image_data, text, max_length, mode))
+
     except Exception as e:
         print(f"Vision analysis error: {e}")
         return f"Error analyzing image: {str(e)}"
 
-async def analyze_image_with_vision(image_data: bytes, query: str) -> str:
-    """Async wrapper for image analysis"""
+class CaptionBatcher:
+    """Micro-batches concurrent caption requests into single encoder/generate calls.
+
+    Requests wait at most `max_wait_ms` for companions; requests sharing a
+    decoding mode and text prefix are run as one batch. While a batch runs
+    in the executor, new arrivals queue up and form the next batch.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 15):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.queue = None
+        self.worker = None
+        self.batches = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+
+    async def submit(self, image_data: PreparedImage, text: str | None, max_length: int, mode: str) -> str:
+        loop = asyncio.get_event_loop()
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = loop.create_task(self._run())
+        future = loop.create_future()
+        await self.queue.put(((mode, text, max_length), image_data, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_event_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._collect()
+
+            groups = {}
+            for key, image_data, future in batch:
+                groups.setdefault(key, []).append((image_data, future))
+
+            for (mode, text, max_length), items in groups.items():
+                start = time.perf_counter()
+                try:
+                    captions = await loop.run_in_executor(
+                        executor,
+                        _generate_captions,
+                        [image_data for image_data, _ in items],
+                        text,
+                        max_length,
+                        mode
+                    )
+                    for (_, future), caption in zip(items, captions):
+                        if not future.done():
+                            future.set_result(caption)
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                self.batches += 1
+                self.images += len(items)
+                self.busy_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "average_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "images_per_second": round(self.images / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue else 0
+        }
+
+caption_batcher = CaptionBatcher()
+
+async def analyze_image_with_vision(image_data: PreparedImage | bytes, query: str, mode: str | None = None) -> str:
+    """Async image analysis through the shared micro-batching queue"""
     if not VISION_AVAILABLE:
         return "Vision AI not available. Install transformers and torch to enable image understanding."
-    
+
     try:
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            executor,
-            _analyze_image_sync,
-            image_data,
-            query
-        )
-        return result
-        
+        if not isinstance(image_data, PreparedImage):
+            image_data = PreparedImage(image_data)
+        mode = mode or VISION_SETTINGS['default_mode']
+
+        text, max_length = _caption_request(query)
+        generated = await caption_batcher.submit(image_data, text, max_length, mode)
+        return _format_answer(query, text, generated)
+
     except Exception as e:
         return f"Vision analysis failed: {str(e)}"
 
+async def analyze_images_with_vision(images: list[PreparedImage], query: str, mode: str | None = None) -> list[str]:
+    """Analyze several images at once; they reach the batcher together and share a batch"""
+    return await asyncio.gather(*[analyze_image_with_vision(image_data, query, mode) for image_data in images])
+
 def get_vision_status():
     """Get vision AI status"""
     return {
         "available": VISION_AVAILABLE,
-        "model_loaded": vision_model is not None,
-        "message": "Vision AI ready" if VISION_AVAILABLE and vision_model else "Vision AI not available"
-    }
\ No newline at end of file
+        "model_loaded": vision_handle.loaded,
+        "model": vision_handle.status(),
+        "backend": VISION_SETTINGS['backend'],
+        "active_backend": active_backend,
+        "default_mode": VISION_SETTINGS['default_mode'],
+        "encoder_cache": {"entries": len(_encoder_cache), "hits": _encoder_cache_hits},
+        "batching": caption_batcher.stats(),
+        "caption_latency_ms": {
+            key: round(1000 * total / count, 1) for key, (count, total) in _latency_stats.items() if count
+        },
+        "message": "Vision AI ready" if VISION_AVAILABLE else "Vision AI not available"
+    }
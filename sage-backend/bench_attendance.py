@@ -0,0 +1,70 @@
+"""Face detection throughput benchmark for the attendance detectors.
+
+Runs Haar, OpenCV-DNN and OpenVINO on the same images and reports
+frames/sec and detections/sec for single-image calls, plus batched calls
+for the DNN backends.
+
+Usage:
+    python bench_attendance.py photo1.jpg [photo2.jpg ...] [--runs N] [--batch 8]
+"""
+import argparse
+import time
+
+from app.services.face_detection import FaceDetector, _compile_openvino_model, OPENVINO_AVAILABLE
+from app.services.image_preprocessing import PreparedImage
+
+def time_detector(detect, images: list, runs: int, batch: int | None = None) -> tuple[float, float]:
+    """(frames/sec, detections/sec)"""
+    detect(images[:batch] if batch else images[0])  # warm-up
+    frames = detections = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        if batch:
+            for offset in range(0, len(images), batch):
+                results = detect(images[offset:offset + batch])
+                frames += len(results)
+                detections += sum(count for count, _ in results)
+        else:
+            for image in images:
+                count, _ = detect(image)
+                frames += 1
+                detections += count
+    elapsed = time.perf_counter() - start
+    return frames / elapsed, detections / elapsed
+
+def report(label: str, result: tuple[float, float]):
+    frames_per_second, detections_per_second = result
+    print(f"{label:<28} {frames_per_second:8.1f} frames/s   {detections_per_second:8.1f} detections/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark attendance face detectors")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=8)
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            images.append(PreparedImage(f.read()).bgr(max_width=1024))
+
+    haar = FaceDetector('haar')
+    report("haar", time_detector(haar.detect_haar, images, args.runs))
+
+    opencv = FaceDetector('opencv')
+    if opencv.net is None:
+        print("OpenCV DNN face model not found - skipping DNN rows")
+    else:
+        report("opencv-dnn", time_detector(opencv.detect, images, args.runs))
+        report(f"opencv-dnn / batch {args.batch}", time_detector(opencv.detect_batch, images, args.runs, args.batch))
+
+    compiled_model = _compile_openvino_model() if OPENVINO_AVAILABLE else None
+    if compiled_model is None:
+        print("OpenVINO or its face model not available - skipping OpenVINO rows")
+        return
+    openvino = FaceDetector('openvino', compiled_model)
+    report("openvino", time_detector(openvino.detect, images, args.runs))
+    report(f"openvino / batch {args.batch}", time_detector(openvino.detect_batch, images, args.runs, args.batch))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Caption latency benchmark for the BLIP vision backends.
+
+Compares the original PyTorch beam-search path against the OpenVINO greedy
+fast tier, plus a follow-up question on the same image (encoder cache hit).
+
+Usage:
+    python bench_vision.py image1.jpg [image2.png ...] [--runs N]
+"""
+import argparse
+import statistics
+import time
+
+from app.services import vision_service
+from app.services.image_preprocessing import PreparedImage
+
+def time_captions(images: list[bytes], runs: int, mode: str, follow_up: bool = False) -> list[float]:
+    latencies = []
+    for _ in range(runs):
+        for image_bytes in images:
+            prepared = PreparedImage(image_bytes)
+            if not follow_up:
+                vision_service._encoder_cache.clear()
+            else:
+                vision_service._analyze_image_sync(prepared, "describe this image", mode)
+            start = time.perf_counter()
+            vision_service._analyze_image_sync(prepared, "describe this image", mode)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def report(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{label:<32} mean {1000 * statistics.mean(latencies):8.1f} ms   p95 {1000 * p95:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BLIP caption latency")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            images.append(f.read())
+
+    # Baseline: eager PyTorch with 5-beam search
+    vision_service.VISION_SETTINGS['backend'] = 'pytorch'
+    vision_service.initialize_vision()
+    report("pytorch / beam search", time_captions(images, args.runs, "quality"))
+    report("pytorch / greedy", time_captions(images, args.runs, "fast"))
+
+    if not vision_service.OPENVINO_AVAILABLE:
+        print("OpenVINO not installed - skipping OpenVINO rows")
+        return
+
+    vision_service.vision_handle.unload()
+    vision_service.VISION_SETTINGS['backend'] = 'openvino'
+    vision_service.initialize_vision()
+    report("openvino / beam search", time_captions(images, args.runs, "quality"))
+    report("openvino / greedy", time_captions(images, args.runs, "fast"))
+    report("openvino / greedy, cached image", time_captions(images, args.runs, "fast", follow_up=True))
+
+if __name__ == "__main__":
+    main()
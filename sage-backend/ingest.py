@@ -0,0 +1,100 @@
+"""Bulk offline ingestion of course materials into the knowledge base.
+
+Walks a directory (default: data/), extracts PDFs and images in parallel,
+embeds all new chunks in one batched pass and writes the knowledge-base
+files once. A running server picks the result up via POST /knowledge/reload.
+
+Usage:
+    python ingest.py [directory] [--workers N] [--batch-size N] [--rebuild]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core import rag
+from app.services.pdf_service import read_pdf_text, chunk_text
+from app.services.ocr_service import IMAGE_EXTENSIONS, extract_text_chunks_from_image
+
+def find_materials(directory: str) -> list[str]:
+    """Collect PDF and image paths under a directory, sorted for stable output"""
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.lower().endswith((".pdf",) + IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+def extract_document(path: str) -> tuple[str, list[str] | None, int]:
+    """Worker: return (path, chunks, pages) for one file; chunks is None if extraction failed"""
+    try:
+        if path.lower().endswith(".pdf"):
+            all_text, pages = read_pdf_text(path)
+            return path, chunk_text(all_text), pages
+        return path, extract_text_chunks_from_image(path), 1
+    except Exception as e:
+        print(f"Failed to extract {path}: {e}")
+        return path, None, 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of course materials into the knowledge base")
+    parser.add_argument("directory", nargs="?", default="data")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size")
+    parser.add_argument("--rebuild", action="store_true", help="Discard the existing knowledge base first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rag.clear_knowledge_base_on_startup()
+    else:
+        rag.load_knowledge_base()
+
+    paths = find_materials(args.directory)
+    print(f"Found {len(paths)} files in {args.directory}")
+
+    # Skip files whose bytes are already indexed, including copies within this run
+    file_hash_by_path = {}
+    seen_hashes = set()
+    skipped = 0
+    for path in paths:
+        file_hash = rag.hash_file(path)
+        if rag.find_known_file(file_hash) is not None or file_hash in seen_hashes:
+            skipped += 1
+            continue
+        seen_hashes.add(file_hash)
+        file_hash_by_path[path] = file_hash
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        extracted = list(pool.map(extract_document, file_hash_by_path, chunksize=4))
+    extract_seconds = time.perf_counter() - start
+
+    documents = []
+    pages = 0
+    chunk_count = 0
+    for path, chunks, page_count in extracted:
+        if chunks is None:
+            continue
+        pages += page_count
+        chunk_count += len(chunks)
+        # Named by path relative to the ingested directory, so same-named files in
+        # different folders stay apart. Files without text are still recorded by
+        # hash so they aren't extracted again on the next run
+        name = os.path.relpath(path, args.directory)
+        documents.append((name, chunks, file_hash_by_path[path]))
+
+    result = rag.ingest_documents(documents, batch_size=args.batch_size)
+    total_seconds = time.perf_counter() - start
+
+    print("\nIngestion complete")
+    print(f"Files:   {sum(1 for _, chunks, _ in documents if chunks)} ingested, "
+          f"{sum(1 for _, chunks, _ in documents if not chunks)} without text, {skipped} skipped as duplicates")
+    print(f"Pages:   {pages} in {extract_seconds:.2f}s ({pages / max(extract_seconds, 1e-9):.1f} pages/s)")
+    print(f"Chunks:  {chunk_count} extracted, {result['chunks_added']} new after dedup "
+          f"({chunk_count / max(total_seconds, 1e-9):.1f} chunks/s overall)")
+    print(f"Embed:   {result['embed_seconds']:.2f}s "
+          f"({result['chunks_added'] / max(result['embed_seconds'], 1e-9):.1f} chunks/s)")
+    print(f"Total:   {total_seconds:.2f}s")
+
+if __name__ == "__main__":
+    main()
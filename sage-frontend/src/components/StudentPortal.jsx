@@ -53,6 +53,7 @@ export function StudentPortal({ onLogout, userRole = "student" }) {
   const [learningHistory, setLearningHistory] = useState([])
 
   const socketRef = useRef(null)
+  const sessionIdRef = useRef(null)
   const mediaRecorderRef = useRef(null)
   const streamRef = useRef(null)
   
@@ -140,6 +141,9 @@ export function StudentPortal({ onLogout, userRole = "student" }) {
         const data = JSON.parse(event.data)
         
         switch (data.type) {
+          case 'session':
+            sessionIdRef.current = data.session_id
+            break
           case 'chunk_received':
             setAudioStatus(`Recording... (${data.chunk_count} chunks)`)
             break
@@ -200,7 +204,7 @@ export function StudentPortal({ onLogout, userRole = "student" }) {
       }
 
       try {
-        const response = await fetch(API_ENDPOINTS.GET_LAST_RESPONSE);
+        const response = await fetch(`${API_ENDPOINTS.GET_LAST_RESPONSE}?session_id=${encodeURIComponent(sessionIdRef.current)}`);
         if (response.ok) {
           const data = await response.json();
           if (data.ready) {
@@ -67,6 +67,7 @@ export function TeacherDashboard({ onLogout, userRole = "teacher" }) {
   const cameraStreamRef = useRef(null)
 
   const socketRef = useRef(null)
+  const sessionIdRef = useRef(null)
   const mediaRecorderRef = useRef(null)
   const streamRef = useRef(null)
 
@@ -141,6 +142,9 @@ export function TeacherDashboard({ onLogout, userRole = "teacher" }) {
         const data = JSON.parse(event.data)
         
         switch (data.type) {
+          case 'session':
+            sessionIdRef.current = data.session_id
+            break
           case 'chunk_received':
             setAudioStatus(`Recording... (${data.chunk_count} chunks)`)
             break
@@ -198,7 +202,7 @@ export function TeacherDashboard({ onLogout, userRole = "teacher" }) {
       }
 
       try {
-        const response = await fetch(API_ENDPOINTS.GET_LAST_RESPONSE);
+        const response = await fetch(`${API_ENDPOINTS.GET_LAST_RESPONSE}?session_id=${encodeURIComponent(sessionIdRef.current)}`);
         if (response.ok) {
           const data = await response.json();
           if (data.ready) {